@@ -0,0 +1,127 @@
+import sys
+import threading
+import time as _time
+from datetime import date as _date, datetime
+from functools import lru_cache
+
+import config
+
+CREATED_AT_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Slot labels by number; configured slots first, so a slot number is its index
+# in get_available_time_slots(). Unknown labels (older data) are appended.
+SLOT_LABELS = [sys.intern(label) for label in config.get_available_time_slots()]
+_slot_numbers = {label: number for number, label in enumerate(SLOT_LABELS)}
+_slot_lock = threading.Lock()
+
+
+def slot_number(label):
+    """Small int standing for a time slot label"""
+    number = _slot_numbers.get(label)
+    if number is None:
+        with _slot_lock:
+            number = _slot_numbers.get(label)
+            if number is None:
+                number = len(SLOT_LABELS)
+                SLOT_LABELS.append(sys.intern(label))
+                _slot_numbers[label] = number
+    return number
+
+
+@lru_cache(maxsize=None)
+def date_label(day):
+    """'YYYY-MM-DD' for a proleptic Gregorian ordinal, shared by all bookings of that day"""
+    return sys.intern(_date.fromordinal(day).isoformat())
+
+
+@lru_cache(maxsize=4096)
+def day_number(date):
+    """Proleptic Gregorian ordinal of a 'YYYY-MM-DD' date"""
+    return _date.fromisoformat(date).toordinal()
+
+
+class BookingRecord:
+    """A booking stored as a handful of ints and shared strings
+
+    Dates are day ordinals, slots are numbers into SLOT_LABELS, created_at is
+    an epoch second and names are interned. Code that formats bookings reads
+    them like the old dicts (booking['date'], booking.get('name')); those
+    string views are built on access, or use to_dict() for a real dict.
+    The journal stores to_record(), which keeps the epoch second: the
+    formatted created_at is local wall-clock time and only for display.
+    """
+
+    __slots__ = ('id', 'day', 'slot', 'user_id', 'name', 'phone', 'created')
+
+    FIELDS = ('id', 'date', 'time', 'user_id', 'name', 'phone', 'created_at')
+
+    def __init__(self, booking_id, day, slot, user_id, name, phone, created):
+        self.id = booking_id
+        self.day = day
+        self.slot = slot
+        self.user_id = user_id
+        self.name = sys.intern(name)
+        self.phone = phone
+        self.created = created
+
+    @classmethod
+    def create(cls, booking_id, user_id, date, time, name, phone, created=None):
+        """Build a record from the values the handlers work with"""
+        return cls(
+            booking_id, day_number(date), slot_number(time), user_id, name, phone,
+            int(_time.time()) if created is None else created
+        )
+
+    @classmethod
+    def from_dict(cls, booking):
+        """Build a record from its to_record() form (journal, snapshot)"""
+        return cls(
+            booking['id'], day_number(booking['date']), slot_number(booking['time']),
+            booking['user_id'], booking['name'], booking['phone'], booking['created']
+        )
+
+    @property
+    def date(self):
+        return date_label(self.day)
+
+    @property
+    def time(self):
+        return SLOT_LABELS[self.slot]
+
+    @property
+    def created_at(self):
+        return datetime.fromtimestamp(self.created).strftime(CREATED_AT_FORMAT)
+
+    def key(self):
+        """Chronological sort key: (date, time, id)"""
+        return (date_label(self.day), SLOT_LABELS[self.slot], self.id)
+
+    def __getitem__(self, field):
+        if field not in self.FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def get(self, field, default=None):
+        if field not in self.FIELDS:
+            return default
+        return getattr(self, field)
+
+    def __contains__(self, field):
+        return field in self.FIELDS
+
+    def keys(self):
+        return self.FIELDS
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def to_record(self):
+        """Plain dict for the journal and snapshots, with created as an epoch second"""
+        return {
+            'id': self.id, 'date': self.date, 'time': self.time, 'user_id': self.user_id,
+            'name': self.name, 'phone': self.phone, 'created': self.created
+        }
+
+    def __repr__(self):
+        return f"BookingRecord({self.to_dict()!r})"
+
@@ -1,28 +1,33 @@
 import logging
 import os
+from functools import partial
 from telegram.ext import (
     Updater, CommandHandler, MessageHandler, CallbackQueryHandler,
     ConversationHandler, Filters
 )
 from telegram import Bot
 
+import config
 from config import TOKEN
+from bot_identity import BotIdentityCache
+from conversation_persistence import SQLitePersistence
+from storage import store
+from outbound import outbound
+from reminders import reminders
+from runtime import run_async_runtime
 
-# Зберігаємо інформацію про бота
-_bot_info = {"username": "your_bot_name"}
+# Зберігаємо інформацію про бота (спільний кеш для бота і веб-процесу)
+bot_identity = BotIdentityCache(
+    TOKEN,
+    config.BOT_INFO_CACHE_PATH,
+    ttl=config.BOT_INFO_TTL,
+    bot_factory=partial(Bot, base_url=config.TELEGRAM_API_URL)
+)
 
 def get_bot_info():
     """Отримати інформацію про бота"""
-    # Спробуємо отримати актуальну інформацію про бота
-    if TOKEN:
-        try:
-            bot = Bot(TOKEN)
-            bot_user = bot.get_me()
-            _bot_info["username"] = bot_user.username
-        except Exception as e:
-            logger.error(f"Failed to get bot info: {e}")
-    
-    return _bot_info
+    # Повертаємо кешовану інформацію без мережевих запитів
+    return bot_identity.get()
 from handlers import (
     # Command handlers
     start_command, help_command,
@@ -37,17 +42,18 @@ from handlers import (
     view_available_times,
     
     # Admin panel
-    admin_panel, admin_auth, admin_view_all_bookings, admin_view_booking_details,
+    admin_panel, admin_auth, admin_view_all_bookings, admin_bookings_page, admin_view_booking_details,
     admin_cancel_booking, admin_reset_all_prompt, admin_reset_all_bookings,
+    admin_bulk_menu, admin_bulk_mode, admin_bulk_pick, admin_bulk_user_entered, admin_bulk_confirm,
     
     # Navigation
     back_to_main, back_to_dates, back_to_bookings, back_to_admin, back_to_admin_bookings,
-    cancel_operation, handle_text_buttons,
+    cancel_operation, handle_text_buttons, all_bookings_page,
     
     # States
     SELECTING_DATE, SELECTING_TIME, ENTERING_NAME, ENTERING_PHONE,
     CONFIRMING_BOOKING, VIEWING_BOOKINGS, ADMIN_AUTH, ADMIN_MENU,
-    VIEWING_ADMIN_BOOKINGS, ADMIN_CONFIRMING_RESET
+    VIEWING_ADMIN_BOOKINGS, ADMIN_CONFIRMING_RESET, ADMIN_BULK, ADMIN_BULK_USER
 )
 
 # Configure logging
@@ -57,26 +63,36 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def start_bot():
-    """Start the Telegram bot"""
-    global _bot_info
-    
-    # Check if token is available
-    if not TOKEN:
-        logger.error("No Telegram token provided! Set TELEGRAM_BOT_TOKEN environment variable.")
-        return
+def create_updater():
+    """Create the Updater with all handlers registered"""
+    # Keep conversation states across restarts
+    persistence = None
+    if config.CONVERSATIONS_DB:
+        persistence = SQLitePersistence(
+            config.CONVERSATIONS_DB,
+            store,
+            flush_interval=config.PERSISTENCE_FLUSH_INTERVAL
+        )
     
     # Create the Updater and pass it your bot's token
-    updater = Updater(TOKEN)
+    # (the connection pool is shared by the handler threads and the outbound senders)
+    updater = Updater(
+        TOKEN,
+        base_url=config.TELEGRAM_API_URL,
+        workers=config.BOT_WORKERS,
+        persistence=persistence,
+        request_kwargs={'con_pool_size': config.BOT_WORKERS + config.OUTBOUND_WORKERS + 4}
+    )
     
-    # Отримуємо інформацію про бота
-    try:
-        bot = updater.bot
-        bot_user = bot.get_me()
-        _bot_info["username"] = bot_user.username
-        logger.info(f"Bot username: @{bot_user.username}")
-    except Exception as e:
-        logger.error(f"Failed to get bot info: {e}")
+    # Отримуємо інформацію про бота і оновлюємо спільний кеш
+    bot_identity.refresh(updater.bot)
+    
+    # Start sending queued replies
+    outbound.start(updater.bot)
+    
+    # Remind users about their bookings
+    if config.REMINDER_HOURS_BEFORE > 0:
+        reminders.start()
     
     # Get the dispatcher to register handlers
     dispatcher = updater.dispatcher
@@ -116,7 +132,7 @@ def start_bot():
             CommandHandler("start", start_command)
         ],
         name="booking_conversation",
-        persistent=False
+        persistent=persistence is not None
     )
     dispatcher.add_handler(booking_conv_handler)
     
@@ -138,7 +154,7 @@ def start_bot():
             CommandHandler("start", start_command)
         ],
         name="my_bookings_conversation",
-        persistent=False
+        persistent=persistence is not None
     )
     dispatcher.add_handler(my_bookings_conv_handler)
     
@@ -153,11 +169,24 @@ def start_bot():
             ],
             ADMIN_MENU: [
                 CallbackQueryHandler(admin_view_all_bookings, pattern=r'^admin_all_bookings$'),
+                CallbackQueryHandler(admin_bulk_menu, pattern=r'^admin_bulk$'),
                 CallbackQueryHandler(admin_reset_all_prompt, pattern=r'^admin_reset_all$'),
                 CallbackQueryHandler(back_to_main, pattern=r'^back_to_main$')
             ],
+            ADMIN_BULK: [
+                CallbackQueryHandler(admin_bulk_menu, pattern=r'^admin_bulk$'),
+                CallbackQueryHandler(admin_bulk_mode, pattern=r'^bulk_mode_'),
+                CallbackQueryHandler(admin_bulk_pick, pattern=r'^bulk_(date|from|to|slotdate|slot)_'),
+                CallbackQueryHandler(admin_bulk_confirm, pattern=r'^bulk_confirm$'),
+                CallbackQueryHandler(back_to_admin, pattern=r'^back_to_admin$')
+            ],
+            ADMIN_BULK_USER: [
+                MessageHandler(Filters.text & ~Filters.command, admin_bulk_user_entered),
+                CallbackQueryHandler(admin_bulk_menu, pattern=r'^admin_bulk$')
+            ],
             VIEWING_ADMIN_BOOKINGS: [
                 CallbackQueryHandler(admin_view_booking_details, pattern=r'^admin_view_'),
+                CallbackQueryHandler(admin_bookings_page, pattern=r'^admin_page_(next|prev)_'),
                 CallbackQueryHandler(admin_cancel_booking, pattern=r'^admin_cancel_'),
                 CallbackQueryHandler(back_to_admin, pattern=r'^back_to_admin$'),
                 CallbackQueryHandler(back_to_admin_bookings, pattern=r'^back_to_admin_bookings$')
@@ -172,7 +201,7 @@ def start_bot():
             CommandHandler("start", start_command)
         ],
         name="admin_conversation",
-        persistent=False
+        persistent=persistence is not None
     )
     dispatcher.add_handler(admin_conv_handler)
     
@@ -182,16 +211,36 @@ def start_bot():
         view_available_times
     ))
     
+    # Register page navigation for the "All bookings" listing
+    dispatcher.add_handler(CallbackQueryHandler(all_bookings_page, pattern=r'^all_page_(next|prev)_'))
+    
     # Register text button handler for main menu buttons
     dispatcher.add_handler(MessageHandler(
         Filters.text & ~Filters.command, 
         handle_text_buttons
     ))
     
+    return updater
+
+def start_bot():
+    """Start the Telegram bot"""
+    # Check if token is available
+    if not TOKEN:
+        logger.error("No Telegram token provided! Set TELEGRAM_BOT_TOKEN environment variable.")
+        return
+    
+    updater = create_updater()
+    
     # Start the Bot
-    logger.info("Starting bot...")
-    updater.start_polling()
-    updater.idle()
+    if config.BOT_RUNTIME == 'asyncio':
+        logger.info("Starting bot with asyncio runtime...")
+        run_async_runtime(updater)
+    else:
+        logger.info("Starting bot...")
+        updater.start_polling()
+        updater.idle()
+        reminders.stop()
+        outbound.stop()
 
 if __name__ == "__main__":
     start_bot()
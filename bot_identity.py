@@ -0,0 +1,121 @@
+import json
+import logging
+import os
+import threading
+import time as _time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_USERNAME = "your_bot_name"
+
+
+class BotIdentityCache:
+    """Bot username cached in memory and in a small file shared between processes
+
+    get() never does network I/O: it returns the cached identity and, when it
+    is older than `ttl`, starts one background refresh. Only one refresh runs
+    at a time; concurrent callers of refresh() wait for it instead of calling
+    Telegram again.
+    """
+
+    def __init__(self, token, path, ttl=3600, bot_factory=None):
+        self.token = token
+        self.path = path
+        self.ttl = ttl
+        self._bot_factory = bot_factory
+        self._bot = None
+
+        self._lock = threading.Lock()
+        self._info = {"username": DEFAULT_USERNAME}
+        self._fetched_at = 0.0
+        # Set while a refresh is running; callers wait on it (single-flight)
+        self._inflight = None
+
+        self._load_file()
+
+    def _load_file(self):
+        """Adopt the identity saved by another process if it is newer than ours"""
+        if not self.path:
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            if saved.get("fetched_at", 0) > self._fetched_at and saved.get("username"):
+                self._info = {"username": saved["username"]}
+                self._fetched_at = saved["fetched_at"]
+
+    def _save_file(self, info, fetched_at):
+        if not self.path:
+            return
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"username": info["username"], "fetched_at": fetched_at}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Failed to save bot info: {e}")
+
+    def _is_stale(self):
+        return _time.time() - self._fetched_at > self.ttl
+
+    def get(self):
+        """Get the cached bot identity, scheduling a refresh if it is stale"""
+        if self._is_stale():
+            self._load_file()
+            if self._is_stale() and self.token:
+                self._start_refresh(background=True)
+        with self._lock:
+            return dict(self._info)
+
+    def set(self, username):
+        """Store an identity obtained elsewhere (e.g. by the bot at startup)"""
+        fetched_at = _time.time()
+        with self._lock:
+            self._info = {"username": username}
+            self._fetched_at = fetched_at
+        self._save_file({"username": username}, fetched_at)
+
+    def refresh(self, bot=None):
+        """Fetch the identity now, joining a refresh already in progress"""
+        if bot is not None:
+            self._bot = bot
+        self._start_refresh(background=False)
+        with self._lock:
+            return dict(self._info)
+
+    def _start_refresh(self, background):
+        with self._lock:
+            inflight = self._inflight
+            if inflight is None:
+                inflight = self._inflight = threading.Event()
+                owner = True
+            else:
+                owner = False
+
+        if owner:
+            if background:
+                threading.Thread(target=self._fetch, args=(inflight,), name="bot-info-refresh", daemon=True).start()
+            else:
+                self._fetch(inflight)
+        elif not background:
+            inflight.wait()
+
+    def _fetch(self, inflight):
+        try:
+            if self._bot is None:
+                self._bot = self._bot_factory(self.token)
+            bot_user = self._bot.get_me()
+            self.set(bot_user.username)
+            logger.info(f"Bot username: @{bot_user.username}")
+        except Exception as e:
+            logger.error(f"Failed to get bot info: {e}")
+            # Do not retry on every page view while Telegram is unreachable
+            with self._lock:
+                self._fetched_at = _time.time() - self.ttl + min(self.ttl, 60)
+        finally:
+            with self._lock:
+                self._inflight = None
+            inflight.set()
@@ -1,23 +1,159 @@
+import json
 import os
+import threading
+import time
 from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from schedule import Schedule
 
 # Bot configuration
 TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN", "")  # Get token from environment variable
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org/bot")  # Bot API server, e.g. a local one
 
 # Admin configuration
 ADMIN_IDS = [1006518993]  # List of admin user IDs
 ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", "admin")  # Password for admin authentication
 
+# Bot identity cache shared by the bot and the web app
+BOT_INFO_CACHE_PATH = os.environ.get("BOT_INFO_CACHE_PATH", "bot_info.json")
+BOT_INFO_TTL = int(os.environ.get("BOT_INFO_TTL", "3600"))  # Seconds before the cached username is refreshed
+
+# Runtime configuration
+BOT_RUNTIME = os.environ.get("BOT_RUNTIME", "threads")  # "threads" (PTB Updater polling) or "asyncio"
+BOT_WORKERS = int(os.environ.get("BOT_WORKERS", "4"))  # Threads running handlers
+BOT_MAX_IN_FLIGHT = int(os.environ.get("BOT_MAX_IN_FLIGHT", "512"))  # Updates accepted but not finished (asyncio runtime)
+
+# Outbound messages (Telegram allows about 30 messages/s overall and 1 message/s per chat)
+OUTBOUND_WORKERS = int(os.environ.get("OUTBOUND_WORKERS", "4"))  # Threads sending queued messages
+OUTBOUND_GLOBAL_RATE = float(os.environ.get("OUTBOUND_GLOBAL_RATE", "30"))  # Messages per second for the whole bot
+OUTBOUND_CHAT_RATE = float(os.environ.get("OUTBOUND_CHAT_RATE", "1"))  # Messages per second per chat
+OUTBOUND_CHAT_BURST = int(os.environ.get("OUTBOUND_CHAT_BURST", "5"))  # Messages a chat may receive at once
+
+# Webhook configuration (python main.py webhook)
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")  # Public base URL of the web app, e.g. https://example.com
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")  # Checked against X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_QUEUE_SIZE = int(os.environ.get("WEBHOOK_QUEUE_SIZE", "1000"))  # Updates buffered before answering 429
+
 # Booking configuration
-BOOKING_START_HOUR = 9  # Earliest booking time (9:00 AM)
-BOOKING_END_HOUR = 21   # Latest booking time (9:00 PM)
+BOOKING_START_HOUR = 9  # Earliest booking time (9:00 AM), used when no schedule file is set
+BOOKING_END_HOUR = 21   # Latest booking time (9:00 PM), used when no schedule file is set
+SCHEDULE_PATH = os.environ.get("BOOKING_SCHEDULE_PATH", "")  # JSON opening hours, slot lengths and closures (see schedule.py)
 DAYS_IN_ADVANCE = 7     # How many days in advance bookings are allowed
+BOOKING_TIMEZONE = os.environ.get("BOOKING_TIMEZONE", "")  # e.g. "Europe/Kyiv"; empty uses the server's local time
+SLOT_CAPACITY = int(os.environ.get("BOOKING_SLOT_CAPACITY", "1"))  # Bookings one slot can take
+# Capacity overrides as JSON, most specific wins: {"2026-12-31 18:00-19:00": 6, "2026-12-31": 2, "18:00-19:00": 4}
+SLOT_CAPACITY_OVERRIDES = json.loads(os.environ.get("BOOKING_CAPACITY_OVERRIDES", "") or "{}")
+PAGE_SIZE = 10          # Bookings per page in booking listings
+HOLD_TTL_SECONDS = int(os.environ.get("BOOKING_HOLD_TTL", "300"))  # How long a picked slot is kept for the user
+REMINDER_HOURS_BEFORE = float(os.environ.get("BOOKING_REMINDER_HOURS", "2"))  # 0 disables booking reminders
+
+# Conversation state configuration
+STATE_MAX_SIZE = int(os.environ.get("BOOKING_STATE_MAX_SIZE", "10000"))  # Users with an unfinished conversation kept in memory
+STATE_IDLE_TTL = int(os.environ.get("BOOKING_STATE_IDLE_TTL", "3600"))   # Seconds before an abandoned conversation is dropped
+CONVERSATIONS_DB = os.environ.get("BOOKING_CONVERSATIONS_DB", "conversations.db")  # Empty disables conversation persistence
+PERSISTENCE_FLUSH_INTERVAL = float(os.environ.get("BOOKING_PERSISTENCE_FLUSH_INTERVAL", "5"))  # Seconds between batched writes
+
+# Persistence configuration
+STORAGE_BACKEND = os.environ.get("BOOKING_STORAGE", "memory")  # "memory" or "sqlite"
+SQLITE_PATH = os.environ.get("BOOKING_SQLITE_PATH", "bookings.db")
+SQLITE_POOL_SIZE = int(os.environ.get("BOOKING_SQLITE_POOL_SIZE", "4"))
+JOURNAL_DIR = os.environ.get("BOOKING_JOURNAL_DIR", "")  # Empty keeps bookings in memory only
+JOURNAL_FLUSH_INTERVAL = float(os.environ.get("BOOKING_JOURNAL_FLUSH_INTERVAL", "0.01"))  # Group commit window in seconds
+JOURNAL_SNAPSHOT_EVERY = int(os.environ.get("BOOKING_JOURNAL_SNAPSHOT_EVERY", "10000"))  # Records between snapshots
+
+class BookingCalendar:
+    """Booking slots and the date window, computed once and shared as tuples
+
+    Slots come from a compiled Schedule: `slots` holds every label any day
+    uses, slots_on(date) the ones of a single date. The date window (open
+    days only) is rebuilt once per day, at local midnight in `timezone`, and
+    replaced in one assignment, so every caller sees the same "today" even
+    when a day rolls over in the middle of an update.
+    """
+
+    def __init__(self, timezone=None, clock=time.time, capacity=1, capacity_overrides=None, schedule=None):
+        self.timezone = ZoneInfo(timezone) if timezone else None
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.schedule = schedule or Schedule.hourly(BOOKING_START_HOUR, BOOKING_END_HOUR)
+        self.slots = self.schedule.slots
+        # Default places per slot, and overrides keyed by "date time", date or time
+        self.default_capacity = capacity
+        self._capacities = {key: int(value) for key, value in (capacity_overrides or {}).items()}
+        # (dates, next rollover timestamp), swapped as a whole
+        self._window = ((), 0)
+
+    def now(self):
+        """Current wall-clock time in the booking timezone (naive)"""
+        return datetime.fromtimestamp(self._clock(), self.timezone).replace(tzinfo=None)
 
-# Time slots available for booking (1-hour increments)
+    def dates(self):
+        """Bookable dates, today first"""
+        dates, rollover = self._window
+        if self._clock() >= rollover:
+            dates = self._roll()
+        return dates
+
+    def today(self):
+        return self.now().strftime("%Y-%m-%d")
+
+    def slots_on(self, date):
+        """Slots of a date in display order (empty when closed)"""
+        return self.schedule.day(date).slots
+
+    def slot_mask(self, date):
+        """Bitmap of the slots of a date, one bit per label in `slots`"""
+        return self.schedule.day(date).mask
+
+    def timestamp(self, moment):
+        """Unix time of a naive wall-clock datetime in the booking timezone"""
+        return moment.replace(tzinfo=self.timezone).timestamp() if self.timezone else moment.timestamp()
+
+    def capacity(self, date, time):
+        """Number of bookings a slot can take (0 if the slot is not on that date's schedule)"""
+        if time not in self.schedule.day(date).times:
+            return 0
+        capacities = self._capacities
+        if not capacities:
+            return self.default_capacity
+        capacity = capacities.get(f"{date} {time}")
+        if capacity is None:
+            capacity = capacities.get(date)
+        if capacity is None:
+            capacity = capacities.get(time, self.default_capacity)
+        return capacity
+
+    def _roll(self):
+        with self._lock:
+            dates, rollover = self._window
+            now = self._clock()
+            if now < rollover:
+                return dates
+            today = datetime.fromtimestamp(now, self.timezone).date()
+            dates = tuple(
+                date for date in ((today + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(DAYS_IN_ADVANCE))
+                if self.schedule.is_open(date)
+            )
+            rollover = self.timestamp(datetime.combine(today + timedelta(days=1), datetime.min.time()))
+            self._window = (dates, rollover)
+            return dates
+
+
+calendar = BookingCalendar(
+    BOOKING_TIMEZONE, capacity=SLOT_CAPACITY, capacity_overrides=SLOT_CAPACITY_OVERRIDES,
+    schedule=Schedule.load(SCHEDULE_PATH) if SCHEDULE_PATH else None
+)
+
+# Every time slot any day of the schedule uses
 def get_available_time_slots():
-    return [f"{hour:02d}:00-{(hour+1):02d}:00" for hour in range(BOOKING_START_HOUR, BOOKING_END_HOUR)]
+    return calendar.slots
+
+# Time slots of one date (empty when closed)
+def get_time_slots(date):
+    return calendar.slots_on(date)
 
 # Get date range for the next DAYS_IN_ADVANCE days
 def get_date_range():
-    today = datetime.now().date()
-    return [(today + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(DAYS_IN_ADVANCE)]
+    return calendar.dates()
@@ -0,0 +1,226 @@
+import json
+import logging
+import sqlite3
+import threading
+import time as _time
+from collections import defaultdict
+
+from telegram.ext import BasePersistence
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        user_id INTEGER PRIMARY KEY,
+        conversations TEXT NOT NULL,
+        user_state TEXT,
+        updated_at REAL NOT NULL
+    )
+"""
+SELECT_SESSION = "SELECT conversations, user_state, updated_at FROM sessions WHERE user_id = ?"
+UPSERT_SESSION = (
+    "INSERT INTO sessions (user_id, conversations, user_state, updated_at) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(user_id) DO UPDATE SET conversations = excluded.conversations, "
+    "user_state = excluded.user_state, updated_at = excluded.updated_at"
+)
+DELETE_SESSION = "DELETE FROM sessions WHERE user_id = ?"
+
+
+def _encode_key(key):
+    return ",".join(str(part) for part in key)
+
+
+def _decode_key(text):
+    return tuple(int(part) for part in text.split(","))
+
+
+class _LazyConversations(dict):
+    """Conversation dict that pulls a user's saved state on first access"""
+
+    def __init__(self, persistence, name):
+        super().__init__()
+        self._persistence = persistence
+        self._name = name
+
+    def _load(self, key):
+        if key:
+            self._persistence.load_user(key[-1])
+
+    def get(self, key, default=None):
+        self._load(key)
+        return super().get(key, default)
+
+    def __getitem__(self, key):
+        self._load(key)
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        self._load(key)
+        return super().__contains__(key)
+
+
+class SQLitePersistence(BasePersistence):
+    """PTB persistence that keeps conversation states and DataStore user states in one SQLite table
+
+    Nothing is read at startup: a user's row is loaded the first time one of
+    their updates reaches a conversation handler. Changes only mark the user
+    dirty; a background thread writes all dirty users in one transaction every
+    `flush_interval` seconds, and flush() writes the rest on shutdown.
+    """
+
+    def __init__(self, path, data_store, flush_interval=5.0):
+        super().__init__(store_user_data=False, store_chat_data=False, store_bot_data=False)
+        self.path = path
+        self.data_store = data_store
+        self.flush_interval = flush_interval
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(SCHEMA)
+        self._db_lock = threading.Lock()
+
+        self._lock = threading.RLock()
+        # Conversation dicts handed to ConversationHandler: {name: _LazyConversations}
+        self._conversations = {}
+        # Users whose row was already read (or who are known to have none)
+        self._loaded_users = set()
+        # Conversation keys seen per user: {user_id: {(name, key), ...}}
+        self._user_keys = defaultdict(set)
+        # Users with changes not yet written
+        self._dirty = set()
+
+        # Merge the DataStore's own per-user state into the same rows
+        data_store.user_states.listener = self.mark_dirty
+
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="persistence-flusher", daemon=True)
+        self._flusher.start()
+
+    # Loading
+    def load_user(self, user_id):
+        """Restore a user's conversation states and DataStore state once per process"""
+        if user_id in self._loaded_users:
+            return
+        with self._lock:
+            if user_id in self._loaded_users:
+                return
+            self._loaded_users.add(user_id)
+
+            with self._db_lock:
+                row = self._conn.execute(SELECT_SESSION, (user_id,)).fetchone()
+            if row is None:
+                return
+
+            conversations, user_state, updated_at = row
+            for name, states in json.loads(conversations).items():
+                target = self.get_conversations(name)
+                for key, state in states.items():
+                    key = _decode_key(key)
+                    dict.__setitem__(target, key, state)
+                    self._user_keys[user_id].add((name, key))
+
+            # Abandoned booking data is only restored while it would still be alive in memory
+            ttl = self.data_store.user_states.ttl
+            if user_state is not None and (ttl is None or _time.time() - updated_at <= ttl):
+                if self.data_store.user_states.peek(user_id) is None:
+                    self.data_store.user_states.set(user_id, json.loads(user_state), notify=False)
+
+    def get_conversations(self, name):
+        with self._lock:
+            if name not in self._conversations:
+                self._conversations[name] = _LazyConversations(self, name)
+            return self._conversations[name]
+
+    def get_user_data(self):
+        return defaultdict(dict)
+
+    def get_chat_data(self):
+        return defaultdict(dict)
+
+    def get_bot_data(self):
+        return {}
+
+    # Updates (called for every update, so they only mark users dirty)
+    def mark_dirty(self, user_id):
+        # Load first, so a flush never overwrites a saved row we have not read yet
+        self.load_user(user_id)
+        with self._lock:
+            self._dirty.add(user_id)
+
+    def update_conversation(self, name, key, new_state):
+        if key:
+            self.load_user(key[-1])
+            with self._lock:
+                self._user_keys[key[-1]].add((name, key))
+                self._dirty.add(key[-1])
+
+    def update_user_data(self, user_id, data):
+        pass
+
+    def update_chat_data(self, chat_id, data):
+        pass
+
+    def update_bot_data(self, data):
+        pass
+
+    # Writing
+    def _snapshot_user(self, user_id):
+        """Collect everything stored for a user (caller holds the lock)"""
+        conversations = {}
+        keys = self._user_keys.get(user_id, ())
+        for name, key in list(keys):
+            state = dict.get(self._conversations[name], key)
+            if state is None:
+                # The conversation ended
+                keys.discard((name, key))
+            else:
+                conversations.setdefault(name, {})[_encode_key(key)] = state
+        if not keys:
+            self._user_keys.pop(user_id, None)
+        return conversations, self.data_store.user_states.peek(user_id)
+
+    def flush(self):
+        """Write all dirty users in one transaction"""
+        with self._lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, set()
+            now = _time.time()
+            upserts, deletes = [], []
+            for user_id in dirty:
+                conversations, user_state = self._snapshot_user(user_id)
+                if not conversations and user_state is None:
+                    deletes.append((user_id,))
+                else:
+                    upserts.append((
+                        user_id,
+                        json.dumps(conversations),
+                        json.dumps(user_state, ensure_ascii=False) if user_state is not None else None,
+                        now
+                    ))
+
+        with self._db_lock:
+            try:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(UPSERT_SESSION, upserts)
+                self._conn.executemany(DELETE_SESSION, deletes)
+                self._conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                self._conn.execute("ROLLBACK")
+                logger.error(f"Failed to persist conversations: {e}")
+                with self._lock:
+                    self._dirty |= dirty
+                return
+        logger.debug(f"Persisted {len(upserts)} sessions, removed {len(deletes)}")
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """Stop the background flusher and write outstanding changes"""
+        self._stop.set()
+        self._flusher.join()
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
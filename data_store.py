@@ -1,100 +1,621 @@
-from datetime import datetime
+from bisect import bisect_left, bisect_right, insort
 import logging
 import os
+import threading
 from flask import current_app
 
+import config
+import metrics
+from booking_record import BookingRecord
+from holds import SlotHolds
+from state_store import StateStore
+
 # Налаштування логування
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Number of locks guarding slot reservations; unrelated slots rarely share one
+SLOT_LOCK_STRIPES = 64
+
+# Sorts after any time label, used as an inclusive upper bound for a date
+_MAX_TIME = '\uffff'
+# Larger than any booking ID, used as an inclusive upper bound for a slot
+_MAX_ID = float('inf')
+
+def booking_key(booking):
+    """Chronological sort key of a booking: (date, time, id)"""
+    return (booking['date'], booking['time'], booking['id'])
+
+def _discard_sorted(keys, key):
+    """Remove a key from a sorted list if present"""
+    pos = bisect_left(keys, key)
+    if pos < len(keys) and keys[pos] == key:
+        del keys[pos]
+
+def _now_key(now=None):
+    """Booking key prefix of the current moment: slots sorting before it have started"""
+    now = now or config.calendar.now()
+    return (now.strftime("%Y-%m-%d"), now.strftime("%H:%M"))
+
+def subtract_holds(places, held):
+    """Take places held by others ({time: holders}) out of [(time, places), ...]"""
+    if not held:
+        return places
+    return [(time, count - held.get(time, 0)) for time, count in places if count > held.get(time, 0)]
+
+class UserBookings:
+    """Bookings of one user, split into upcoming and past
+    
+    Both parts are insertion-ordered {booking_id: key} maps, so adding and
+    cancelling are O(1). Upcoming bookings move to the past lazily when the
+    user's bookings are read; the upcoming part stays small (at most the
+    booking window), so it is sorted on read.
+    """
+    
+    __slots__ = ('upcoming', 'past')
+    
+    def __init__(self):
+        self.upcoming = {}
+        self.past = {}
+    
+    def add(self, key, now_key):
+        if key < now_key:
+            self.past[key[2]] = key
+        else:
+            self.upcoming[key[2]] = key
+    
+    def discard(self, booking_id):
+        if self.upcoming.pop(booking_id, None) is None:
+            self.past.pop(booking_id, None)
+    
+    def roll(self, now_key):
+        """Move bookings whose slot has started to the past"""
+        started = sorted(key for key in self.upcoming.values() if key < now_key)
+        for key in started:
+            del self.upcoming[key[2]]
+            self.past[key[2]] = key
+    
+    def upcoming_keys(self, now_key):
+        self.roll(now_key)
+        return sorted(self.upcoming.values())
+    
+    def all_keys(self):
+        return sorted(list(self.past.values()) + list(self.upcoming.values()))
+    
+    def __len__(self):
+        return len(self.upcoming) + len(self.past)
+
 # Клас для роботи з даними
 class DataStore:
-    def __init__(self):
-        # Dictionary to store bookings: {booking_id: {date, time, user_id, name, phone}}
+    def __init__(self, journal=None):
+        # Bookings by ID: {booking_id: BookingRecord}
         self.bookings = {}
-        # Dictionary to track booking IDs by user: {user_id: [booking_id1, booking_id2, ...]}
+        # Booking keys by user, split into upcoming and past: {user_id: UserBookings}
         self.user_bookings = {}
+        # Chronological index of all bookings: [(date, time, id), ...]
+        self.booking_order = []
+        # Occupancy counters, per date: {date: {time: bookings}}
+        self.slot_counts = {}
+        # Per-date availability bitmap, one bit per configured slot (set = full): {date: mask}
+        self.date_masks = {}
+        # Every scheduled slot and its bit: (time1, time2, ...), {time: bit}
+        self._slot_times = tuple(config.get_available_time_slots())
+        self._slot_bits = {time: 1 << i for i, time in enumerate(self._slot_times)}
         # Counter for generating unique booking IDs
         self.booking_counter = 1
-        # Dictionary to store user states during conversations: {user_id: {state, data}}
-        self.user_states = {}
+        # Bumped on every booking mutation so derived views know when to rebuild
+        self.version = 0
+        # Store version of the last change per date, and of the last reset: {date: version}
+        self._date_versions = {}
+        self._reset_version = 0
+        # Callbacks told about committed booking changes: listener(event, data)
+        self._listeners = []
+        # Bounded store of user states during conversations: {user_id: {state, data}}
+        self.user_states = StateStore(
+            max_size=config.STATE_MAX_SIZE,
+            ttl=config.STATE_IDLE_TTL
+        )
         # Dictionary to track admin authentications: {user_id: is_authenticated}
         self.admin_auth = {}
         
+        # Serializes booking mutations so the journal order matches the in-memory order
+        self._write_lock = threading.RLock()
+        # Striped locks for check-and-book on a single (date, time) slot
+        self._slot_locks = [threading.Lock() for _ in range(SLOT_LOCK_STRIPES)]
+        # Temporary holds on slots picked by users who have not confirmed yet
+        self.holds = SlotHolds(config.HOLD_TTL_SECONDS)
+        # Optional append-only journal for durability
+        self._journal = journal
+        if journal is not None:
+            self._recover()
+        
         logger.info("DataStore initialized")
     
+    def _recover(self):
+        """Rebuild bookings from the journal snapshot and its tail"""
+        state, records = self._journal.load()
+        now_key = _now_key()
+        if state is not None:
+            self.booking_counter = state['booking_counter']
+            for booking in state['bookings']:
+                self._insert(booking, now_key)
+        
+        for record in records:
+            op = record.get('op')
+            if op == 'add':
+                self._insert(record['booking'], now_key)
+                self.booking_counter = max(self.booking_counter, record['booking']['id'] + 1)
+            elif op == 'cancel':
+                self._remove(record['id'])
+            elif op == 'cancel_many':
+                self._remove_many(record['ids'])
+            elif op == 'reset':
+                self._clear()
+        
+        logger.info(f"Recovered {len(self.bookings)} bookings from journal")
+    
+    def _log(self, record):
+        """Append a record to the journal and compact it when it grows too long"""
+        if self._journal is None:
+            return None
+        
+        seq = self._journal.append(record)
+        if self._journal.needs_snapshot():
+            self._journal.compact({
+                'booking_counter': self.booking_counter,
+                'bookings': list(self.bookings.values())
+            })
+        return seq
+    
+    def _commit(self, seq):
+        """Wait until a journal record is durable (no-op without a journal)"""
+        if seq is not None:
+            self._journal.wait(seq)
+    
+    def add_listener(self, listener):
+        """Register a callback for committed booking changes
+        
+        It is called as listener(event, data): ('add', booking),
+        ('cancel', booking_id), ('cancel_many', [booking_id, ...])
+        or ('reset', None).
+        """
+        self._listeners.append(listener)
+    
+    def remove_listener(self, listener):
+        """Unregister a callback added with add_listener"""
+        # A new list, so a _notify() iterating the old one is not disturbed
+        self._listeners = [known for known in self._listeners if known != listener]
+    
+    def _notify(self, event, data=None):
+        """Tell the listeners about a committed change"""
+        for listener in self._listeners:
+            try:
+                listener(event, data)
+            except Exception:
+                logger.exception(f"Booking listener failed on {event}")
+    
+    def _bump(self):
+        """Mark that bookings changed"""
+        with self._write_lock:
+            self.version += 1
+    
+    def _touch(self, date):
+        """Record that bookings on a date changed, once the indexes are up to date"""
+        self._date_versions[date] = self.version
+    
+    def current_version(self):
+        """Get a value that changes whenever any booking changes"""
+        return self.version
+    
+    def date_version(self, date):
+        """Get a value that changes whenever the bookings on a date change"""
+        return self._date_versions.get(date, self._reset_version)
+    
+    def _insert(self, booking, now_key=None):
+        """Put a booking into the store and all its indexes"""
+        self._bump()
+        if not isinstance(booking, BookingRecord):
+            booking = BookingRecord.from_dict(booking)
+        booking_id = booking.id
+        user_id = booking.user_id
+        date, time = booking.date, booking.time
+        
+        self.bookings[booking_id] = booking
+        
+        # Keep the chronological indexes sorted (both share one key tuple)
+        key = booking.key()
+        insort(self.booking_order, key)
+        user_keys = self.user_bookings.get(user_id)
+        if user_keys is None:
+            user_keys = self.user_bookings[user_id] = UserBookings()
+        user_keys.add(key, now_key or _now_key())
+        
+        # Count the place taken; the slot's bit is set once it is full
+        day = self.slot_counts.get(date)
+        if day is None:
+            day = self.slot_counts[date] = {}
+        count = day[time] = day.get(time, 0) + 1
+        bit = self._slot_bits.get(time)
+        if bit is not None and count >= config.calendar.capacity(date, time):
+            self.date_masks[date] = self.date_masks.get(date, 0) | bit
+        self._touch(date)
+    
+    def _remove(self, booking_id):
+        """Take a booking out of the store and all its indexes"""
+        booking = self.bookings.pop(booking_id, None)
+        if booking is None:
+            return None
+        self._bump()
+        
+        _discard_sorted(self.booking_order, booking.key())
+        self._unindex(booking)
+        self._touch(booking.date)
+        return booking
+    
+    def _remove_many(self, booking_ids):
+        """Take several bookings out of the store, rebuilding the chronological index once"""
+        removed = []
+        for booking_id in booking_ids:
+            booking = self.bookings.pop(booking_id, None)
+            if booking is not None:
+                self._unindex(booking)
+                removed.append(booking)
+        if not removed:
+            return removed
+        self._bump()
+        
+        # A few deletions are cheaper one by one; many are one pass over the index
+        if len(removed) <= 32:
+            for booking in removed:
+                _discard_sorted(self.booking_order, booking.key())
+        else:
+            gone = {booking.id for booking in removed}
+            self.booking_order = [key for key in self.booking_order if key[2] not in gone]
+        for booking in removed:
+            self._touch(booking.date)
+        return removed
+    
+    def _unindex(self, booking):
+        """Drop a booking from the per-user and per-slot indexes"""
+        booking_id = booking.id
+        user_keys = self.user_bookings.get(booking.user_id)
+        if user_keys is not None:
+            user_keys.discard(booking_id)
+            if not user_keys:
+                del self.user_bookings[booking.user_id]
+        
+        # Give the place back; a slot below capacity is no longer full
+        date, time = booking.date, booking.time
+        day = self.slot_counts.get(date)
+        if day is not None and time in day:
+            count = day[time] - 1
+            if count:
+                day[time] = count
+            else:
+                del day[time]
+                if not day:
+                    del self.slot_counts[date]
+            bit = self._slot_bits.get(time)
+            if bit is not None and date in self.date_masks and count < config.calendar.capacity(date, time):
+                mask = self.date_masks[date] & ~bit
+                if mask:
+                    self.date_masks[date] = mask
+                else:
+                    del self.date_masks[date]
+    
+    def _clear(self):
+        """Drop all bookings and indexes"""
+        self._bump()
+        self.bookings = {}
+        self.user_bookings = {}
+        self.booking_order = []
+        self.slot_counts = {}
+        self.date_masks = {}
+        self.booking_counter = 1
+        self._date_versions = {}
+        self._reset_version = self.version
+    
     def add_booking(self, user_id, date, time, name, phone):
         """Add a new booking to the store"""
-        booking_id = self.booking_counter
-        self.booking_counter += 1
-        
-        # Store booking details
-        self.bookings[booking_id] = {
-            'id': booking_id,
-            'date': date,
-            'time': time,
-            'user_id': user_id,
-            'name': name,
-            'phone': phone,
-            'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        
-        # Add to user's bookings list
-        if user_id not in self.user_bookings:
-            self.user_bookings[user_id] = []
-        self.user_bookings[user_id].append(booking_id)
+        with self._write_lock:
+            booking_id = self.booking_counter
+            self.booking_counter += 1
+            
+            # Store booking details
+            booking = BookingRecord.create(booking_id, user_id, date, time, name, phone)
+            self._insert(booking)
+            seq = self._log({'op': 'add', 'booking': booking})
         
+        self._commit(seq)
+        metrics.BOOKINGS_CREATED.inc()
+        self._notify('add', booking)
         logger.info(f"Added booking {booking_id} for user {user_id} on {date} at {time}")
         return booking_id
     
+    def _slot_lock(self, date, time):
+        """Get the lock stripe responsible for a slot"""
+        return self._slot_locks[hash((date, time)) % SLOT_LOCK_STRIPES]
+    
+    def reserve(self, user_id, date, time, name, phone):
+        """Atomically book a slot if it is still free
+        
+        Returns the new booking ID, or None if the slot has no place left.
+        """
+        with self._slot_lock(date, time):
+            if not self.is_time_slot_available(date, time, user_id):
+                metrics.BOOKING_CONFLICTS.labels('reserve').inc()
+                logger.info(f"Slot {date} {time} is full, reservation for user {user_id} rejected")
+                return None
+            booking_id = self.add_booking(user_id, date, time, name, phone)
+        
+        self.holds.release(user_id)
+        return booking_id
+    
     def get_bookings_for_user(self, user_id):
-        """Get all bookings for a specific user"""
-        booking_ids = self.user_bookings.get(user_id, [])
-        result = []
-        for bid in booking_ids:
-            if bid in self.bookings:
-                result.append(self.bookings[bid])
-        return result
+        """Get all bookings for a specific user, past ones included, in chronological order"""
+        with self._write_lock:
+            user_keys = self.user_bookings.get(user_id)
+            if user_keys is None:
+                return []
+            return [self.bookings[key[2]] for key in user_keys.all_keys()]
+    
+    def upcoming_for_user(self, user_id, now=None):
+        """Get the bookings of a user whose slot has not started yet, soonest first"""
+        with self._write_lock:
+            user_keys = self.user_bookings.get(user_id)
+            if user_keys is None:
+                return []
+            return [self.bookings[key[2]] for key in user_keys.upcoming_keys(_now_key(now))]
     
     def get_all_bookings(self):
-        """Get all bookings in the system"""
-        return list(self.bookings.values())
+        """Get all bookings in the system in chronological order"""
+        with self._write_lock:
+            return [self.bookings[key[2]] for key in self.booking_order]
+    
+    def bookings_between(self, start, end):
+        """Get bookings with dates from start to end inclusive, in chronological order"""
+        with self._write_lock:
+            order = self.booking_order
+            lo = bisect_left(order, (start,))
+            hi = bisect_right(order, (end, _MAX_TIME))
+            return [self.bookings[key[2]] for key in order[lo:hi]]
+    
+    def bookings_on(self, date):
+        """Get bookings on a date in chronological order"""
+        return self.bookings_between(date, date)
+    
+    def upcoming(self, limit=None, now=None):
+        """Get bookings whose slot has not started yet, soonest first"""
+        with self._write_lock:
+            order = self.booking_order
+            lo = bisect_left(order, _now_key(now))
+            hi = len(order) if limit is None else min(len(order), lo + limit)
+            return [self.bookings[key[2]] for key in order[lo:hi]]
+    
+    def bookings_page(self, after=None, before=None, limit=10):
+        """Get one page of bookings in chronological order, starting from a cursor
+        
+        Cursors are booking keys (date, time, id). `after` returns the page
+        following that key, `before` the page preceding it.
+        Returns (bookings, has_prev, has_next).
+        """
+        with self._write_lock:
+            order = self.booking_order
+            if before is not None:
+                end = bisect_left(order, before)
+                start = max(0, end - limit)
+            else:
+                start = bisect_right(order, after) if after is not None else 0
+                end = start + limit
+            page = [self.bookings[key[2]] for key in order[start:end]]
+            return page, start > 0, end < len(order)
     
     def cancel_booking(self, booking_id):
         """Cancel a booking by ID"""
-        if booking_id not in self.bookings:
-            return False
-        
-        user_id = self.bookings[booking_id]['user_id']
-        if user_id in self.user_bookings and booking_id in self.user_bookings[user_id]:
-            self.user_bookings[user_id].remove(booking_id)
+        with self._write_lock:
+            if self._remove(booking_id) is None:
+                return False
+            seq = self._log({'op': 'cancel', 'id': booking_id})
         
-        del self.bookings[booking_id]
+        self._commit(seq)
+        metrics.BOOKINGS_CANCELLED.inc()
+        self._notify('cancel', booking_id)
         logger.info(f"Cancelled booking {booking_id}")
         return True
     
-    def is_time_slot_available(self, date, time):
-        """Check if a time slot is available"""
-        for bid, booking in self.bookings.items():
-            if booking['date'] == date and booking['time'] == time:
-                return False
-        return True
+    def _cancel_selected(self, select):
+        """Cancel the bookings picked by select() as one batch
+        
+        select() runs under the write lock and returns booking IDs. Indexes,
+        the journal and listeners are updated once for the whole batch.
+        Returns a summary: {'cancelled': count, 'users': count, 'bookings': [...]}.
+        """
+        with self._write_lock:
+            removed = self._remove_many(list(select()))
+            seq = None
+            if removed:
+                seq = self._log({'op': 'cancel_many', 'ids': [booking.id for booking in removed]})
+        
+        self._commit(seq)
+        return self._cancelled(removed)
     
-    def get_available_slots(self, date, available_times):
-        """Get available time slots for a specific date"""
-        available_slots = []
+    def _cancelled(self, removed):
+        """Report a committed batch cancellation and build its summary"""
+        if removed:
+            metrics.BOOKINGS_CANCELLED.inc(len(removed))
+            self._notify('cancel_many', [booking['id'] for booking in removed])
+            logger.info(f"Cancelled {len(removed)} bookings in one batch")
+        return {
+            'cancelled': len(removed),
+            'users': len({booking['user_id'] for booking in removed}),
+            'bookings': removed
+        }
+    
+    def cancel_bookings(self, booking_ids):
+        """Cancel several bookings by ID in one batch"""
+        return self._cancel_selected(lambda: booking_ids)
+    
+    def cancel_bookings_between(self, start, end):
+        """Cancel every booking with a date from start to end inclusive"""
+        def select():
+            order = self.booking_order
+            lo = bisect_left(order, (start,))
+            hi = bisect_right(order, (end, _MAX_TIME))
+            return [key[2] for key in order[lo:hi]]
+        return self._cancel_selected(select)
+    
+    def cancel_bookings_on(self, date):
+        """Cancel every booking on a date"""
+        return self.cancel_bookings_between(date, date)
+    
+    def cancel_bookings_for_user(self, user_id):
+        """Cancel every upcoming booking of a user"""
+        def select():
+            user_keys = self.user_bookings.get(user_id)
+            if user_keys is None:
+                return []
+            return [key[2] for key in user_keys.upcoming_keys(_now_key())]
+        return self._cancel_selected(select)
+    
+    def cancel_slot(self, date, time):
+        """Cancel the bookings of one slot"""
+        def select():
+            order = self.booking_order
+            lo = bisect_left(order, (date, time))
+            hi = bisect_right(order, (date, time, _MAX_ID))
+            return [key[2] for key in order[lo:hi]]
+        return self._cancel_selected(select)
+    
+    def reset_bookings(self):
+        """Remove all bookings and reset the ID counter"""
+        with self._write_lock:
+            self._clear()
+            seq = self._log({'op': 'reset'})
         
+        self._commit(seq)
+        self._notify('reset')
+        logger.info("All bookings have been reset")
+    
+    def get_booking(self, booking_id):
+        """Get a single booking by ID"""
+        return self.bookings.get(booking_id)
+    
+    def booking_count(self):
+        """Number of stored bookings"""
+        return len(self.bookings)
+    
+    def count_on(self, date):
+        """Number of bookings on a date"""
+        with self._write_lock:
+            day = self.slot_counts.get(date)
+            return sum(day.values()) if day else 0
+    
+    def count_slot(self, date, time):
+        """Number of bookings in a slot"""
+        return self._booked_count(date, time)
+    
+    def count_between(self, start, end):
+        """Number of bookings with dates from start to end inclusive"""
+        with self._write_lock:
+            order = self.booking_order
+            return bisect_right(order, (end, _MAX_TIME)) - bisect_left(order, (start,))
+    
+    def _booked_count(self, date, time):
+        """Get the number of bookings in a slot"""
+        day = self.slot_counts.get(date)
+        return day.get(time, 0) if day is not None else 0
+    
+    def _booked_counts(self, date):
+        """Get the number of bookings per booked time on a date: {time: bookings}"""
+        return self.slot_counts.get(date)
+    
+    def places_left(self, date, time, user_id=None):
+        """Count the places in a slot that user_id can still book"""
+        capacity = config.calendar.capacity(date, time)
+        return max(0, capacity - self._booked_count(date, time)
+                   - self.holds.held_by_others_count(date, time, user_id))
+    
+    def is_time_slot_available(self, date, time, user_id=None):
+        """Check if a time slot has a place left (for user_id, if given)"""
+        return self.places_left(date, time, user_id) > 0
+    
+    def open_places(self, date, available_times):
+        """Get the times on a date with places not taken by bookings, holds ignored: [(time, places), ...]"""
+        counts = self._booked_counts(date) or {}
+        capacity = config.calendar.capacity
+        result = []
         for time in available_times:
-            if self.is_time_slot_available(date, time):
-                available_slots.append(time)
-        
-        return available_slots
+            places = capacity(date, time) - counts.get(time, 0)
+            if places > 0:
+                result.append((time, places))
+        return result
+    
+    def available_places(self, date, available_times, user_id=None):
+        """Get the times on a date with places left and how many: [(time, places), ...]"""
+        return subtract_holds(
+            self.open_places(date, available_times), self.holds.held_by_others(date, user_id)
+        )
+    
+    def get_available_slots(self, date, available_times, user_id=None):
+        """Get available time slots for a specific date"""
+        return [time for time, _ in self.available_places(date, available_times, user_id)]
+    
+    def _booked_mask(self, date):
+        """Get the bitmap of full configured slots on a date"""
+        return self.date_masks.get(date, 0)
+    
+    def free_mask(self, date, user_id=None):
+        """Get the bitmap of configured slots on a date that user_id can still book"""
+        mask = config.calendar.slot_mask(date) & ~self._booked_mask(date)
+        held = self.holds.held_by_others(date, user_id)
+        if held:
+            counts = self._booked_counts(date) or {}
+            for time, holders in held.items():
+                if counts.get(time, 0) + holders >= config.calendar.capacity(date, time):
+                    mask &= ~self._slot_bits.get(time, 0)
+        return mask
+    
+    def count_free(self, date, user_id=None):
+        """Count the free configured slots on a date"""
+        return self.free_mask(date, user_id).bit_count()
+    
+    def count_free_by_date(self, dates, user_id=None):
+        """Count the free configured slots for each date: {date: count}"""
+        return {date: self.count_free(date, user_id) for date in dates}
+    
+    def free_places_by_date(self, dates, user_id=None):
+        """Get the free configured slots and their places left for each date: {date: [(time, places), ...]}"""
+        result = {}
+        for date in dates:
+            mask = self.free_mask(date, user_id)
+            counts = self._booked_counts(date) or {}
+            held = self.holds.held_by_others(date, user_id) if mask else {}
+            places = []
+            while mask:
+                low = mask & -mask
+                time = self._slot_times[low.bit_length() - 1]
+                places.append((time, config.calendar.capacity(date, time) - counts.get(time, 0) - held.get(time, 0)))
+                mask ^= low
+            result[date] = places
+        return result
+    
+    def hold_slot(self, user_id, date, time):
+        """Hold a free slot for a user while they fill in the booking form"""
+        places = config.calendar.capacity(date, time) - self._booked_count(date, time)
+        if places <= 0 or not self.holds.hold(user_id, date, time, places):
+            metrics.BOOKING_CONFLICTS.labels('hold').inc()
+            return False
+        return True
+    
+    def release_hold(self, user_id):
+        """Release the slot held by a user, if any"""
+        return self.holds.release(user_id)
     
     def set_user_state(self, user_id, state, data=None):
         """Set the current state for a user in a conversation"""
         if data is None:
             data = {}
-        self.user_states[user_id] = {'state': state, 'data': data}
+        self.user_states.set(user_id, {'state': state, 'data': data})
     
     def get_user_state(self, user_id):
         """Get the current state for a user"""
@@ -102,8 +623,7 @@ class DataStore:
     
     def clear_user_state(self, user_id):
         """Clear the state for a user"""
-        if user_id in self.user_states:
-            del self.user_states[user_id]
+        self.user_states.pop(user_id)
     
     def authenticate_admin(self, user_id, is_authenticated=True):
         """Set admin authentication status"""
@@ -117,6 +637,3 @@ class DataStore:
             return True
             
         return self.admin_auth.get(user_id, False)
-
-# Create a global instance of the data store
-store = DataStore()
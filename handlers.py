@@ -4,23 +4,130 @@ from telegram import Update, ReplyKeyboardRemove
 from telegram.ext import CallbackContext, ConversationHandler
 
 import config
-from data_store import store
+from storage import store
+from metrics import timed_handler
+from outbound import BULK, outbound
+from render_cache import render_cache
 from keyboard_markups import (
-    main_menu_keyboard, generate_dates_keyboard, generate_times_keyboard,
-    generate_bookings_keyboard, booking_actions_keyboard, admin_menu_keyboard,
+    main_menu_keyboard, generate_bookings_keyboard, booking_actions_keyboard, admin_menu_keyboard,
     admin_bookings_keyboard, admin_booking_actions_keyboard, cancel_keyboard,
-    admin_confirm_reset_keyboard
+    admin_confirm_reset_keyboard, all_bookings_page_keyboard, admin_bulk_menu_keyboard,
+    admin_bulk_dates_keyboard, admin_bulk_times_keyboard, admin_bulk_back_keyboard,
+    admin_bulk_confirm_keyboard
+)
+from utils import (
+    validate_phone_number, validate_name, format_booking_info, format_date_for_display,
+    encode_booking_cursor, decode_booking_cursor
 )
-from utils import validate_phone_number, validate_name, format_booking_info
 
 # Define states for conversation handlers
 (
     SELECTING_DATE, SELECTING_TIME, ENTERING_NAME, ENTERING_PHONE,
     CONFIRMING_BOOKING, VIEWING_BOOKINGS, ADMIN_AUTH, ADMIN_MENU,
-    VIEWING_ADMIN_BOOKINGS, ADMIN_CONFIRMING_RESET
-) = range(10)
+    VIEWING_ADMIN_BOOKINGS, ADMIN_CONFIRMING_RESET, ADMIN_BULK, ADMIN_BULK_USER
+) = range(12)
+
+# Paginated listings
+def admin_bookings_page_markup(cursor=None, backwards=False):
+    """Build the admin bookings keyboard for one page, or None if there are no bookings"""
+    if backwards:
+        bookings, has_prev, has_next = store.bookings_page(before=cursor, limit=config.PAGE_SIZE)
+    else:
+        bookings, has_prev, has_next = store.bookings_page(after=cursor, limit=config.PAGE_SIZE)
+    
+    if not bookings:
+        return None
+    
+    return admin_bookings_keyboard(
+        bookings,
+        prev_cursor=encode_booking_cursor(bookings[0]) if has_prev else None,
+        next_cursor=encode_booking_cursor(bookings[-1]) if has_next else None
+    )
+
+def all_bookings_page_text(cursor=None, backwards=False):
+    """Build the "All bookings" text for one page: (text, navigation markup)"""
+    if backwards:
+        bookings, has_prev, has_next = store.bookings_page(before=cursor, limit=config.PAGE_SIZE)
+    else:
+        bookings, has_prev, has_next = store.bookings_page(after=cursor, limit=config.PAGE_SIZE)
+    
+    if not bookings:
+        return None, None
+    
+    bookings_text = "📋 *Все бронирования:*\n\n"
+    for booking in bookings:
+        date_parts = booking['date'].split('-')
+        display_date = f"{date_parts[2]}.{date_parts[1]}.{date_parts[0]}"
+        bookings_text += (
+            f"*{display_date} {booking['time']}*\n"
+            f"👤 Имя: {booking['name']}\n"
+            f"📞 Телефон: {booking['phone']}\n\n"
+        )
+    
+    page_markup = all_bookings_page_keyboard(
+        prev_cursor=encode_booking_cursor(bookings[0]) if has_prev else None,
+        next_cursor=encode_booking_cursor(bookings[-1]) if has_next else None
+    )
+    return bookings_text, page_markup
+
+# Bulk cancellation
+def bulk_cancel_description(operation):
+    """Describe a pending bulk cancellation"""
+    mode = operation['mode']
+    if mode == 'date':
+        return f"все бронирования на {format_date_for_display(operation['date'])}"
+    if mode == 'range':
+        return (
+            f"все бронирования с {format_date_for_display(operation['start'])} "
+            f"по {format_date_for_display(operation['end'])}"
+        )
+    if mode == 'slot':
+        return f"бронирования слота {format_date_for_display(operation['date'])} {operation['time']}"
+    return f"все предстоящие бронирования пользователя {operation['user_id']}"
+
+def bulk_cancel_count(operation):
+    """Count the bookings a pending bulk cancellation would remove"""
+    mode = operation['mode']
+    if mode == 'date':
+        return store.count_on(operation['date'])
+    if mode == 'range':
+        return store.count_between(operation['start'], operation['end'])
+    if mode == 'slot':
+        return store.count_slot(operation['date'], operation['time'])
+    return len(store.upcoming_for_user(operation['user_id']))
+
+def run_bulk_cancel(operation):
+    """Run a bulk cancellation as one batch and return its summary"""
+    mode = operation['mode']
+    if mode == 'date':
+        return store.cancel_bookings_on(operation['date'])
+    if mode == 'range':
+        return store.cancel_bookings_between(operation['start'], operation['end'])
+    if mode == 'slot':
+        return store.cancel_slot(operation['date'], operation['time'])
+    return store.cancel_bookings_for_user(operation['user_id'])
+
+def bulk_cancel_prompt(operation):
+    """Confirmation text for a pending bulk cancellation"""
+    return (
+        "⚠️ *Массовая отмена*\n\n"
+        f"Будут отменены {bulk_cancel_description(operation)}.\n"
+        f"Найдено бронирований: {bulk_cancel_count(operation)}\n\n"
+        "Продолжить?"
+    )
+
+def notify_cancelled_users(bookings):
+    """Tell users that an admin cancelled their bookings (bulk lane, behind interactive replies)"""
+    for booking in bookings:
+        outbound.send_message(
+            booking['user_id'],
+            f"❌ Ваше бронирование на {format_date_for_display(booking['date'])} {booking['time']} "
+            "отменено администратором.",
+            priority=BULK
+        )
 
 # Command handlers
+@timed_handler
 def start_command(update: Update, context: CallbackContext):
     """Handler for the /start command"""
     user_id = update.effective_user.id
@@ -32,16 +139,19 @@ def start_command(update: Update, context: CallbackContext):
         "Выберите опцию из меню ниже:"
     )
     
-    # Clear any existing user state
+    # Clear any existing user state and release a held slot
     store.clear_user_state(user_id)
+    store.release_hold(user_id)
     
-    update.message.reply_text(
+    outbound.reply_text(
+        update.message,
         welcome_message,
         reply_markup=main_menu_keyboard()
     )
     
     return ConversationHandler.END
 
+@timed_handler
 def help_command(update: Update, context: CallbackContext):
     """Handler for the /help command"""
     help_text = (
@@ -53,7 +163,8 @@ def help_command(update: Update, context: CallbackContext):
         "Если у вас возникли вопросы, пожалуйста, свяжитесь с администратором."
     )
     
-    update.message.reply_text(
+    outbound.reply_text(
+        update.message,
         help_text,
         parse_mode='Markdown'
     )
@@ -61,6 +172,7 @@ def help_command(update: Update, context: CallbackContext):
     return ConversationHandler.END
 
 # Booking flow handlers
+@timed_handler
 def start_booking(update: Update, context: CallbackContext):
     """Start the booking process by showing available dates"""
     user_id = update.effective_user.id
@@ -74,20 +186,19 @@ def start_booking(update: Update, context: CallbackContext):
     # Set initial state
     store.set_user_state(user_id, 'booking', initial_data)
     
-    # Get available dates for booking
-    dates = config.get_date_range()
-    
-    update.message.reply_text(
+    outbound.reply_text(
+        update.message,
         "📅 Выберите дату для бронирования:",
-        reply_markup=generate_dates_keyboard(dates)
+        reply_markup=render_cache.dates_keyboard(user_id)
     )
     
     return SELECTING_DATE
 
+@timed_handler
 def date_selected(update: Update, context: CallbackContext):
     """Handle date selection and show available times"""
     query = update.callback_query
-    query.answer()
+    outbound.answer_callback_query(query)
     
     user_id = update.effective_user.id
     selected_date = query.data.split('_')[1]  # Extract date from callback
@@ -100,13 +211,13 @@ def date_selected(update: Update, context: CallbackContext):
     store.set_user_state(user_id, 'booking', user_state['data'])
     
     # Get available time slots for the selected date
-    all_time_slots = config.get_available_time_slots()
-    available_slots = store.get_available_slots(selected_date, all_time_slots)
+    available_slots, times_keyboard = render_cache.times(selected_date, user_id)
     
     if not available_slots:
-        query.edit_message_text(
+        outbound.edit_message_text(
+            query.message,
             f"На выбранную дату нет свободных слотов. Пожалуйста, выберите другую дату.",
-            reply_markup=generate_dates_keyboard(config.get_date_range())
+            reply_markup=render_cache.dates_keyboard(user_id)
         )
         return SELECTING_DATE
     
@@ -114,17 +225,19 @@ def date_selected(update: Update, context: CallbackContext):
     display_date = selected_date.split('-')
     display_date = f"{display_date[2]}.{display_date[1]}.{display_date[0]}"
     
-    query.edit_message_text(
+    outbound.edit_message_text(
+        query.message,
         f"Дата: {display_date}\n\nВыберите время:",
-        reply_markup=generate_times_keyboard(available_slots)
+        reply_markup=times_keyboard
     )
     
     return SELECTING_TIME
 
+@timed_handler
 def time_selected(update: Update, context: CallbackContext):
     """Handle time selection and ask for user's name"""
     query = update.callback_query
-    query.answer()
+    outbound.answer_callback_query(query)
     
     user_id = update.effective_user.id
     selected_time = query.data.split('_')[1]  # Extract time from callback
@@ -134,17 +247,40 @@ def time_selected(update: Update, context: CallbackContext):
     if 'data' not in user_state:
         user_state['data'] = {}
     
+    # Hold the slot so nobody else can take it while the user fills in the form
+    selected_date = user_state['data'].get('selected_date')
+    if not selected_date or not store.hold_slot(user_id, selected_date, selected_time):
+        available_slots, times_keyboard = (
+            render_cache.times(selected_date, user_id) if selected_date else ((), None)
+        )
+        if available_slots:
+            outbound.edit_message_text(
+                query.message,
+                "К сожалению, это время уже занято. Пожалуйста, выберите другое время:",
+                reply_markup=times_keyboard
+            )
+            return SELECTING_TIME
+        
+        outbound.edit_message_text(
+            query.message,
+            "На выбранную дату нет свободных слотов. Пожалуйста, выберите другую дату.",
+            reply_markup=render_cache.dates_keyboard(user_id)
+        )
+        return SELECTING_DATE
+    
     # Update user state with selected time
     user_state['data']['selected_time'] = selected_time
     store.set_user_state(user_id, 'booking', user_state['data'])
     
-    query.edit_message_text(
+    outbound.edit_message_text(
+        query.message,
         "Введите ваше имя:",
         reply_markup=cancel_keyboard()
     )
     
     return ENTERING_NAME
 
+@timed_handler
 def name_entered(update: Update, context: CallbackContext):
     """Handle name input and ask for phone number"""
     user_id = update.effective_user.id
@@ -152,7 +288,8 @@ def name_entered(update: Update, context: CallbackContext):
     
     # Validate name
     if not validate_name(name):
-        update.message.reply_text(
+        outbound.reply_text(
+            update.message,
             "Пожалуйста, введите корректное имя (только буквы, пробелы и дефисы, 2-50 символов):",
             reply_markup=cancel_keyboard()
         )
@@ -167,13 +304,15 @@ def name_entered(update: Update, context: CallbackContext):
     user_state['data']['name'] = name
     store.set_user_state(user_id, 'booking', user_state['data'])
     
-    update.message.reply_text(
+    outbound.reply_text(
+        update.message,
         "Введите ваш номер телефона:",
         reply_markup=cancel_keyboard()
     )
     
     return ENTERING_PHONE
 
+@timed_handler
 def phone_entered(update: Update, context: CallbackContext):
     """Handle phone number input and confirm booking"""
     user_id = update.effective_user.id
@@ -182,7 +321,8 @@ def phone_entered(update: Update, context: CallbackContext):
     # Get current user state
     user_state = store.get_user_state(user_id)
     if not user_state or 'data' not in user_state:
-        update.message.reply_text(
+        outbound.reply_text(
+            update.message,
             "Произошла ошибка с сохранением данных. Пожалуйста, начните бронирование заново, нажав кнопку '📅 Забронировать'",
             reply_markup=main_menu_keyboard()
         )
@@ -190,7 +330,8 @@ def phone_entered(update: Update, context: CallbackContext):
         
     # Validate phone number
     if not validate_phone_number(phone):
-        update.message.reply_text(
+        outbound.reply_text(
+            update.message,
             "Пожалуйста, введите корректный номер телефона:",
             reply_markup=cancel_keyboard()
         )
@@ -199,7 +340,8 @@ def phone_entered(update: Update, context: CallbackContext):
     # Get or initialize user state
     user_state = store.get_user_state(user_id)
     if 'data' not in user_state:
-        update.message.reply_text(
+        outbound.reply_text(
+            update.message,
             "Произошла ошибка. Пожалуйста, начните бронирование заново.",
             reply_markup=main_menu_keyboard()
         )
@@ -212,7 +354,8 @@ def phone_entered(update: Update, context: CallbackContext):
     # Check if we have all required data
     required_fields = ['selected_date', 'selected_time', 'name']
     if not all(field in user_state['data'] for field in required_fields):
-        update.message.reply_text(
+        outbound.reply_text(
+            update.message,
             "Произошла ошибка. Пожалуйста, начните бронирование заново.",
             reply_markup=main_menu_keyboard()
         )
@@ -238,39 +381,41 @@ def phone_entered(update: Update, context: CallbackContext):
         [{"text": "❌ Отмена", "callback_data": "cancel_operation"}]
     ]
     
-    update.message.reply_text(
+    outbound.reply_text(
+        update.message,
         confirmation_text,
         reply_markup={"inline_keyboard": keyboard}
     )
     
     return CONFIRMING_BOOKING
 
+@timed_handler
 def confirm_booking(update: Update, context: CallbackContext):
     """Handle booking confirmation and save booking"""
     query = update.callback_query
-    query.answer()
+    outbound.answer_callback_query(query)
     
     user_id = update.effective_user.id
     user_state = store.get_user_state(user_id)
     booking_data = user_state['data']
     
-    # Check if the time slot is still available
-    if not store.is_time_slot_available(booking_data['selected_date'], booking_data['selected_time']):
-        query.edit_message_text(
-            "К сожалению, это время уже забронировано. Пожалуйста, выберите другое время.",
+    # The form may have been dropped (idle TTL, eviction) while the conversation lived on
+    required_fields = ['selected_date', 'selected_time', 'name', 'phone']
+    if not all(field in booking_data for field in required_fields):
+        outbound.edit_message_text(
+            query.message,
+            "Время ожидания истекло, данные бронирования не сохранились.",
             reply_markup=None
         )
-        
-        # Restart the booking process
-        dates = config.get_date_range()
-        query.message.reply_text(
+        outbound.reply_text(
+            query.message,
             "📅 Выберите дату для бронирования:",
-            reply_markup=generate_dates_keyboard(dates)
+            reply_markup=render_cache.dates_keyboard(user_id)
         )
         return SELECTING_DATE
     
-    # Save the booking
-    booking_id = store.add_booking(
+    # Book the slot atomically; None means someone else took it first
+    booking_id = store.reserve(
         user_id,
         booking_data['selected_date'],
         booking_data['selected_time'],
@@ -278,10 +423,26 @@ def confirm_booking(update: Update, context: CallbackContext):
         booking_data['phone']
     )
     
+    if booking_id is None:
+        outbound.edit_message_text(
+            query.message,
+            "К сожалению, это время уже забронировано. Пожалуйста, выберите другое время.",
+            reply_markup=None
+        )
+        
+        # Restart the booking process
+        outbound.reply_text(
+            query.message,
+            "📅 Выберите дату для бронирования:",
+            reply_markup=render_cache.dates_keyboard(user_id)
+        )
+        return SELECTING_DATE
+    
     # Clear user state
     store.clear_user_state(user_id)
     
-    query.edit_message_text(
+    outbound.edit_message_text(
+        query.message,
         "✅ Бронирование успешно создано!\n\n"
         f"Номер бронирования: #{booking_id}\n\n"
         "Вы можете просмотреть или отменить бронирование в разделе 'Мои бронирования'.",
@@ -290,53 +451,38 @@ def confirm_booking(update: Update, context: CallbackContext):
     
     return ConversationHandler.END
 
+@timed_handler
 def view_available_times(update: Update, context: CallbackContext):
     """Show available time slots for the next several days"""
-    dates = config.get_date_range()
-    all_time_slots = config.get_available_time_slots()
-    
-    availability_text = "⏰ *Доступное время для бронирования:*\n\n"
-    
-    for date in dates:
-        # Get available slots for this date
-        available_slots = store.get_available_slots(date, all_time_slots)
-        
-        # Format the date for display
-        date_parts = date.split('-')
-        display_date = f"{date_parts[2]}.{date_parts[1]}.{date_parts[0]}"
-        
-        if available_slots:
-            # Format the slots in groups of 3 for readability
-            slot_groups = [available_slots[i:i+3] for i in range(0, len(available_slots), 3)]
-            formatted_slots = '\n'.join([', '.join(group) for group in slot_groups])
-            
-            availability_text += f"📅 *{display_date}*:\n{formatted_slots}\n\n"
-        else:
-            availability_text += f"📅 *{display_date}*: Нет свободных слотов\n\n"
+    user_id = update.effective_user.id
     
-    update.message.reply_text(
-        availability_text,
+    outbound.reply_text(
+        update.message,
+        render_cache.availability_text(user_id),
         parse_mode='Markdown'
     )
     
     return ConversationHandler.END
 
 # My bookings handlers
+@timed_handler
 def view_my_bookings(update: Update, context: CallbackContext):
     """Show user's bookings with options to cancel"""
     user_id = update.effective_user.id
     
-    # Get all bookings for this user
-    user_bookings = store.get_bookings_for_user(user_id)
+    # Get the bookings this user can still attend
+    user_bookings = store.upcoming_for_user(user_id)
     
     if not user_bookings:
-        update.message.reply_text(
+        outbound.reply_text(
+            update.message,
             "У вас нет активных бронирований.",
             reply_markup=main_menu_keyboard()
         )
         return ConversationHandler.END
     
-    update.message.reply_text(
+    outbound.reply_text(
+        update.message,
         "🔍 Ваши бронирования:\n"
         "Выберите бронирование для просмотра деталей.",
         reply_markup=generate_bookings_keyboard(user_bookings)
@@ -344,26 +490,29 @@ def view_my_bookings(update: Update, context: CallbackContext):
     
     return VIEWING_BOOKINGS
 
+@timed_handler
 def view_booking_details(update: Update, context: CallbackContext):
     """Show details for a specific booking"""
     query = update.callback_query
-    query.answer()
+    outbound.answer_callback_query(query)
     
     booking_id = int(query.data.split('_')[1])
-    booking = store.bookings.get(booking_id)
+    booking = store.get_booking(booking_id)
     
     if not booking:
-        query.edit_message_text(
+        outbound.edit_message_text(
+            query.message,
             "Бронирование не найдено или было отменено.",
             reply_markup=generate_bookings_keyboard(
-                store.get_bookings_for_user(update.effective_user.id)
+                store.upcoming_for_user(update.effective_user.id)
             )
         )
         return VIEWING_BOOKINGS
     
     booking_info = format_booking_info(booking)
     
-    query.edit_message_text(
+    outbound.edit_message_text(
+        query.message,
         f"📋 *Детали бронирования #{booking_id}*\n\n{booking_info}",
         reply_markup=booking_actions_keyboard(booking_id),
         parse_mode='Markdown'
@@ -371,10 +520,11 @@ def view_booking_details(update: Update, context: CallbackContext):
     
     return VIEWING_BOOKINGS
 
+@timed_handler
 def cancel_booking(update: Update, context: CallbackContext):
     """Cancel a specific booking"""
     query = update.callback_query
-    query.answer()
+    outbound.answer_callback_query(query)
     
     booking_id = int(query.data.split('_')[1])
     
@@ -382,33 +532,38 @@ def cancel_booking(update: Update, context: CallbackContext):
     success = store.cancel_booking(booking_id)
     
     if success:
-        query.edit_message_text(
+        outbound.edit_message_text(
+            query.message,
             f"✅ Бронирование #{booking_id} успешно отменено.",
             reply_markup=None
         )
         
         # Show updated bookings list
-        user_bookings = store.get_bookings_for_user(update.effective_user.id)
+        user_bookings = store.upcoming_for_user(update.effective_user.id)
         
         if user_bookings:
-            query.message.reply_text(
+            outbound.reply_text(
+                query.message,
                 "🔍 Ваши бронирования:",
                 reply_markup=generate_bookings_keyboard(user_bookings)
             )
         else:
-            query.message.reply_text(
+            outbound.reply_text(
+                query.message,
                 "У вас нет активных бронирований.",
                 reply_markup=main_menu_keyboard()
             )
             return ConversationHandler.END
     else:
-        query.edit_message_text(
+        outbound.edit_message_text(
+            query.message,
             "❌ Не удалось отменить бронирование. Возможно, оно уже было отменено.",
             reply_markup=None
         )
         
         # Return to main menu
-        query.message.reply_text(
+        outbound.reply_text(
+            query.message,
             "Возвращение в главное меню.",
             reply_markup=main_menu_keyboard()
         )
@@ -417,6 +572,7 @@ def cancel_booking(update: Update, context: CallbackContext):
     return VIEWING_BOOKINGS
 
 # Admin panel handlers
+@timed_handler
 def admin_panel(update: Update, context: CallbackContext):
     """Access the admin panel"""
     user_id = update.effective_user.id
@@ -425,7 +581,8 @@ def admin_panel(update: Update, context: CallbackContext):
     if user_id in config.ADMIN_IDS:
         # Автоматично аутентифікуємо користувача з дозволеним ID
         store.authenticate_admin(user_id)
-        update.message.reply_text(
+        outbound.reply_text(
+            update.message,
             "👑 *Панель администратора*\n\n"
             "Выберите действие:",
             reply_markup=admin_menu_keyboard(),
@@ -435,7 +592,8 @@ def admin_panel(update: Update, context: CallbackContext):
         
     # Check if already authenticated
     if store.is_admin_authenticated(user_id):
-        update.message.reply_text(
+        outbound.reply_text(
+            update.message,
             "👑 *Панель администратора*\n\n"
             "Выберите действие:",
             reply_markup=admin_menu_keyboard(),
@@ -444,12 +602,14 @@ def admin_panel(update: Update, context: CallbackContext):
         return ADMIN_MENU
     
     # Ask for password
-    update.message.reply_text(
+    outbound.reply_text(
+        update.message,
         "Пожалуйста, введите пароль администратора:",
         reply_markup=ReplyKeyboardRemove()
     )
     return ADMIN_AUTH
 
+@timed_handler
 def admin_auth(update: Update, context: CallbackContext):
     """Authenticate admin with password"""
     user_id = update.effective_user.id
@@ -462,7 +622,8 @@ def admin_auth(update: Update, context: CallbackContext):
         # Authenticate admin
         store.authenticate_admin(user_id)
         
-        update.message.reply_text(
+        outbound.reply_text(
+            update.message,
             "✅ Аутентификация успешна.\n\n"
             "👑 *Панель администратора*\n\n"
             "Выберите действие:",
@@ -471,54 +632,86 @@ def admin_auth(update: Update, context: CallbackContext):
         )
         return ADMIN_MENU
     else:
-        update.message.reply_text(
+        outbound.reply_text(
+            update.message,
             "❌ Неверный пароль.\n\n"
             "Возвращение в главное меню.",
             reply_markup=main_menu_keyboard()
         )
         return ConversationHandler.END
 
+@timed_handler
 def admin_view_all_bookings(update: Update, context: CallbackContext):
     """Admin view of all bookings"""
     query = update.callback_query
-    query.answer()
+    outbound.answer_callback_query(query)
     
-    all_bookings = store.get_all_bookings()
+    bookings_markup = admin_bookings_page_markup()
     
-    if not all_bookings:
-        query.edit_message_text(
+    if bookings_markup is None:
+        outbound.edit_message_text(
+            query.message,
             "В системе нет активных бронирований.",
             reply_markup=admin_menu_keyboard()
         )
         return ADMIN_MENU
     
-    query.edit_message_text(
+    outbound.edit_message_text(
+        query.message,
+        "📋 *Все бронирования:*\n"
+        "Выберите бронирование для просмотра деталей.",
+        reply_markup=bookings_markup,
+        parse_mode='Markdown'
+    )
+    
+    return VIEWING_ADMIN_BOOKINGS
+
+@timed_handler
+def admin_bookings_page(update: Update, context: CallbackContext):
+    """Show the previous or next page of the admin bookings list"""
+    query = update.callback_query
+    outbound.answer_callback_query(query)
+    
+    # Callback format: admin_page_<next|prev>_<cursor>
+    _, _, direction, cursor = query.data.split('_', 3)
+    bookings_markup = admin_bookings_page_markup(
+        cursor=decode_booking_cursor(cursor), backwards=(direction == 'prev')
+    )
+    
+    if bookings_markup is None:
+        bookings_markup = admin_bookings_page_markup()
+    
+    outbound.edit_message_text(
+        query.message,
         "📋 *Все бронирования:*\n"
         "Выберите бронирование для просмотра деталей.",
-        reply_markup=admin_bookings_keyboard(all_bookings),
+        reply_markup=bookings_markup,
         parse_mode='Markdown'
     )
     
     return VIEWING_ADMIN_BOOKINGS
 
+@timed_handler
 def admin_view_booking_details(update: Update, context: CallbackContext):
     """Admin view of specific booking details"""
     query = update.callback_query
-    query.answer()
+    outbound.answer_callback_query(query)
     
     booking_id = int(query.data.split('_')[2])  # Extract ID from admin_view_X
-    booking = store.bookings.get(booking_id)
+    booking = store.get_booking(booking_id)
     
     if not booking:
-        query.edit_message_text(
+        outbound.edit_message_text(
+            query.message,
             "Бронирование не найдено или было отменено.",
-            reply_markup=admin_bookings_keyboard(store.get_all_bookings())
+            reply_markup=admin_bookings_page_markup()
         )
         return VIEWING_ADMIN_BOOKINGS
     
     booking_info = format_booking_info(booking)
     
-    query.edit_message_text(
+    outbound.edit_message_text(
+        query.message,
         f"📋 *Детали бронирования #{booking_id}*\n\n{booking_info}",
         reply_markup=admin_booking_actions_keyboard(booking_id),
         parse_mode='Markdown'
@@ -526,10 +719,11 @@ def admin_view_booking_details(update: Update, context: CallbackContext):
     
     return VIEWING_ADMIN_BOOKINGS
 
+@timed_handler
 def admin_cancel_booking(update: Update, context: CallbackContext):
     """Admin cancellation of a booking"""
     query = update.callback_query
-    query.answer()
+    outbound.answer_callback_query(query)
     
     booking_id = int(query.data.split('_')[2])  # Extract ID from admin_cancel_X
     
@@ -537,28 +731,32 @@ def admin_cancel_booking(update: Update, context: CallbackContext):
     success = store.cancel_booking(booking_id)
     
     if success:
-        query.edit_message_text(
+        outbound.edit_message_text(
+            query.message,
             f"✅ Бронирование #{booking_id} успешно отменено.",
             reply_markup=None
         )
         
         # Show updated bookings list
-        all_bookings = store.get_all_bookings()
+        bookings_markup = admin_bookings_page_markup()
         
-        if all_bookings:
-            query.message.reply_text(
+        if bookings_markup is not None:
+            outbound.reply_text(
+                query.message,
                 "📋 *Все бронирования:*",
-                reply_markup=admin_bookings_keyboard(all_bookings),
+                reply_markup=bookings_markup,
                 parse_mode='Markdown'
             )
         else:
-            query.message.reply_text(
+            outbound.reply_text(
+                query.message,
                 "В системе нет активных бронирований.",
                 reply_markup=admin_menu_keyboard()
             )
             return ADMIN_MENU
     else:
-        query.edit_message_text(
+        outbound.edit_message_text(
+            query.message,
             "❌ Не удалось отменить бронирование. Возможно, оно уже было отменено.",
             reply_markup=admin_menu_keyboard()
         )
@@ -566,12 +764,14 @@ def admin_cancel_booking(update: Update, context: CallbackContext):
     
     return VIEWING_ADMIN_BOOKINGS
 
+@timed_handler
 def admin_reset_all_prompt(update: Update, context: CallbackContext):
     """Prompt for confirmation before resetting all bookings"""
     query = update.callback_query
-    query.answer()
+    outbound.answer_callback_query(query)
     
-    query.edit_message_text(
+    outbound.edit_message_text(
+        query.message,
         "⚠️ *ВНИМАНИЕ!* ⚠️\n\n"
         "Вы собираетесь удалить ВСЕ бронирования из системы.\n"
         "Это действие нельзя отменить.\n\n"
@@ -582,71 +782,244 @@ def admin_reset_all_prompt(update: Update, context: CallbackContext):
     
     return ADMIN_CONFIRMING_RESET
 
+@timed_handler
 def admin_reset_all_bookings(update: Update, context: CallbackContext):
     """Reset all bookings in the system"""
     query = update.callback_query
-    query.answer()
+    outbound.answer_callback_query(query)
     
     # Reset bookings in the data store
-    store.bookings = {}
-    store.user_bookings = {}
-    store.booking_counter = 1
+    store.reset_bookings()
     
-    query.edit_message_text(
+    outbound.edit_message_text(
+        query.message,
         "✅ Все бронирования успешно удалены из системы.",
         reply_markup=admin_menu_keyboard()
     )
     
     return ADMIN_MENU
 
+@timed_handler
+def admin_bulk_menu(update: Update, context: CallbackContext):
+    """Show the bulk cancellation options"""
+    query = update.callback_query
+    outbound.answer_callback_query(query)
+    
+    outbound.edit_message_text(
+        query.message,
+        "🗑 *Массовая отмена*\n\n"
+        "Выберите, какие бронирования отменить:",
+        reply_markup=admin_bulk_menu_keyboard(),
+        parse_mode='Markdown'
+    )
+    
+    return ADMIN_BULK
+
+@timed_handler
+def admin_bulk_mode(update: Update, context: CallbackContext):
+    """Start a bulk cancellation by date, date range, slot or user"""
+    query = update.callback_query
+    outbound.answer_callback_query(query)
+    
+    user_id = update.effective_user.id
+    mode = query.data.split('_')[2]  # Extract mode from bulk_mode_X
+    store.set_user_state(user_id, 'admin_bulk', {'mode': mode})
+    
+    if mode == 'user':
+        outbound.edit_message_text(
+            query.message,
+            "Введите ID пользователя, чьи предстоящие бронирования нужно отменить:",
+            reply_markup=admin_bulk_back_keyboard()
+        )
+        return ADMIN_BULK_USER
+    
+    prompts = {
+        'date': ("bulk_date", "Выберите дату:"),
+        'range': ("bulk_from", "Выберите первую дату диапазона:"),
+        'slot': ("bulk_slotdate", "Выберите дату слота:")
+    }
+    prefix, prompt = prompts[mode]
+    dates = config.get_date_range()
+    booking_counts = {date: store.count_on(date) for date in dates}
+    
+    outbound.edit_message_text(
+        query.message,
+        prompt,
+        reply_markup=admin_bulk_dates_keyboard(dates, prefix, booking_counts)
+    )
+    
+    return ADMIN_BULK
+
+@timed_handler
+def admin_bulk_pick(update: Update, context: CallbackContext):
+    """Handle a date or time picked for a bulk cancellation"""
+    query = update.callback_query
+    outbound.answer_callback_query(query)
+    
+    user_id = update.effective_user.id
+    step, value = query.data.rsplit('_', 1)  # bulk_<step>_<date or time>
+    operation = store.get_user_state(user_id)['data']
+    
+    if 'mode' not in operation:
+        return admin_bulk_menu(update, context)
+    
+    if step == 'bulk_from':
+        operation['start'] = value
+        store.set_user_state(user_id, 'admin_bulk', operation)
+        dates = [date for date in config.get_date_range() if date >= value]
+        booking_counts = {date: store.count_on(date) for date in dates}
+        outbound.edit_message_text(
+            query.message,
+            "Выберите последнюю дату диапазона:",
+            reply_markup=admin_bulk_dates_keyboard(dates, "bulk_to", booking_counts)
+        )
+        return ADMIN_BULK
+    
+    if step == 'bulk_slotdate':
+        operation['date'] = value
+        store.set_user_state(user_id, 'admin_bulk', operation)
+        times = sorted({booking['time'] for booking in store.bookings_on(value)})
+        if not times:
+            outbound.edit_message_text(
+                query.message,
+                "На эту дату нет бронирований.",
+                reply_markup=admin_bulk_back_keyboard()
+            )
+            return ADMIN_BULK
+        outbound.edit_message_text(
+            query.message,
+            "Выберите слот:",
+            reply_markup=admin_bulk_times_keyboard(times)
+        )
+        return ADMIN_BULK
+    
+    if step == 'bulk_to':
+        operation['end'] = value
+    elif step == 'bulk_slot':
+        operation['time'] = value
+    else:
+        operation['date'] = value
+    store.set_user_state(user_id, 'admin_bulk', operation)
+    
+    outbound.edit_message_text(
+        query.message,
+        bulk_cancel_prompt(operation),
+        reply_markup=admin_bulk_confirm_keyboard(),
+        parse_mode='Markdown'
+    )
+    
+    return ADMIN_BULK
+
+@timed_handler
+def admin_bulk_user_entered(update: Update, context: CallbackContext):
+    """Handle the user ID entered for a bulk cancellation"""
+    user_id = update.effective_user.id
+    text = update.message.text.strip()
+    
+    if not text.isdigit():
+        outbound.reply_text(
+            update.message,
+            "Пожалуйста, введите числовой ID пользователя:",
+            reply_markup=admin_bulk_back_keyboard()
+        )
+        return ADMIN_BULK_USER
+    
+    operation = {'mode': 'user', 'user_id': int(text)}
+    store.set_user_state(user_id, 'admin_bulk', operation)
+    
+    outbound.reply_text(
+        update.message,
+        bulk_cancel_prompt(operation),
+        reply_markup=admin_bulk_confirm_keyboard(),
+        parse_mode='Markdown'
+    )
+    
+    return ADMIN_BULK
+
+@timed_handler
+def admin_bulk_confirm(update: Update, context: CallbackContext):
+    """Run the confirmed bulk cancellation"""
+    query = update.callback_query
+    outbound.answer_callback_query(query)
+    
+    user_id = update.effective_user.id
+    operation = store.get_user_state(user_id)['data']
+    store.clear_user_state(user_id)
+    
+    if 'mode' not in operation:
+        return admin_bulk_menu(update, context)
+    
+    summary = run_bulk_cancel(operation)
+    notify_cancelled_users(summary['bookings'])
+    
+    outbound.edit_message_text(
+        query.message,
+        f"✅ Отменены {bulk_cancel_description(operation)}.\n\n"
+        f"Бронирований: {summary['cancelled']}\n"
+        f"Пользователей уведомлено: {summary['users']}",
+        reply_markup=admin_menu_keyboard()
+    )
+    
+    return ADMIN_MENU
+
 # Navigation handlers
+@timed_handler
 def back_to_main(update: Update, context: CallbackContext):
     """Return to main menu"""
     query = update.callback_query
-    query.answer()
+    outbound.answer_callback_query(query)
     
-    query.edit_message_text(
+    outbound.edit_message_text(
+        query.message,
         "Главное меню. Выберите опцию из кнопок ниже.",
         reply_markup=None
     )
     
     return ConversationHandler.END
 
+@timed_handler
 def back_to_dates(update: Update, context: CallbackContext):
     """Return to date selection"""
     query = update.callback_query
-    query.answer()
+    outbound.answer_callback_query(query)
     
-    dates = config.get_date_range()
+    # The user is picking again, so the previously chosen slot is no longer needed
+    user_id = update.effective_user.id
+    store.release_hold(user_id)
     
-    query.edit_message_text(
+    outbound.edit_message_text(
+        query.message,
         "📅 Выберите дату для бронирования:",
-        reply_markup=generate_dates_keyboard(dates)
+        reply_markup=render_cache.dates_keyboard(user_id)
     )
     
     return SELECTING_DATE
 
+@timed_handler
 def back_to_bookings(update: Update, context: CallbackContext):
     """Return to bookings list"""
     query = update.callback_query
-    query.answer()
+    outbound.answer_callback_query(query)
     
     user_id = update.effective_user.id
-    user_bookings = store.get_bookings_for_user(user_id)
+    user_bookings = store.upcoming_for_user(user_id)
     
-    query.edit_message_text(
+    outbound.edit_message_text(
+        query.message,
         "🔍 Ваши бронирования:",
         reply_markup=generate_bookings_keyboard(user_bookings)
     )
     
     return VIEWING_BOOKINGS
 
+@timed_handler
 def back_to_admin(update: Update, context: CallbackContext):
     """Return to admin menu"""
     query = update.callback_query
-    query.answer()
+    outbound.answer_callback_query(query)
     
-    query.edit_message_text(
+    outbound.edit_message_text(
+        query.message,
         "👑 *Панель администратора*\n\n"
         "Выберите действие:",
         reply_markup=admin_menu_keyboard(),
@@ -655,33 +1028,38 @@ def back_to_admin(update: Update, context: CallbackContext):
     
     return ADMIN_MENU
 
+@timed_handler
 def back_to_admin_bookings(update: Update, context: CallbackContext):
     """Return to admin bookings list"""
     query = update.callback_query
-    query.answer()
-    
-    all_bookings = store.get_all_bookings()
+    outbound.answer_callback_query(query)
     
-    query.edit_message_text(
+    outbound.edit_message_text(
+        query.message,
         "📋 *Все бронирования:*",
-        reply_markup=admin_bookings_keyboard(all_bookings),
+        reply_markup=admin_bookings_page_markup() or admin_bookings_keyboard([]),
         parse_mode='Markdown'
     )
     
     return VIEWING_ADMIN_BOOKINGS
 
+@timed_handler
 def cancel_operation(update: Update, context: CallbackContext):
     """Cancel the current operation and return to main menu"""
+    store.release_hold(update.effective_user.id)
+    
     query = update.callback_query
     if query:
-        query.answer()
-        query.edit_message_text(
+        outbound.answer_callback_query(query)
+        outbound.edit_message_text(
+            query.message,
             "❌ Операция отменена.\n\n"
             "Вернитесь в главное меню, используя кнопки внизу экрана.",
             reply_markup=None
         )
     else:
-        update.message.reply_text(
+        outbound.reply_text(
+            update.message,
             "❌ Операция отменена.\n\n"
             "Вернитесь в главное меню, используя кнопки внизу экрана.",
             reply_markup=main_menu_keyboard()
@@ -689,7 +1067,34 @@ def cancel_operation(update: Update, context: CallbackContext):
     
     return ConversationHandler.END
 
+@timed_handler
+def all_bookings_page(update: Update, context: CallbackContext):
+    """Show the previous or next page of the "All bookings" listing"""
+    query = update.callback_query
+    outbound.answer_callback_query(query)
+    
+    # Callback format: all_page_<next|prev>_<cursor>
+    _, _, direction, cursor = query.data.split('_', 3)
+    bookings_text, page_markup = all_bookings_page_text(
+        cursor=decode_booking_cursor(cursor), backwards=(direction == 'prev')
+    )
+    
+    if bookings_text is None:
+        bookings_text, page_markup = all_bookings_page_text()
+    if bookings_text is None:
+        outbound.edit_message_text(query.message, "В системе нет активных бронирований.", reply_markup=None)
+        return ConversationHandler.END
+    
+    outbound.edit_message_text(
+        query.message,
+        bookings_text,
+        parse_mode='Markdown',
+        reply_markup=page_markup
+    )
+    return ConversationHandler.END
+
 # Message handler for text buttons
+@timed_handler
 def handle_text_buttons(update: Update, context: CallbackContext):
     """Handle main menu text buttons"""
     text = update.message.text
@@ -699,28 +1104,20 @@ def handle_text_buttons(update: Update, context: CallbackContext):
     elif text == "🔍 Мои бронирования":
         return view_my_bookings(update, context)
     elif text == "📋 Все бронирования":
-        all_bookings = store.get_all_bookings()
-        if not all_bookings:
-            update.message.reply_text(
+        bookings_text, page_markup = all_bookings_page_text()
+        if bookings_text is None:
+            outbound.reply_text(
+                update.message,
                 "В системе нет активных бронирований.",
                 reply_markup=main_menu_keyboard()
             )
             return ConversationHandler.END
-            
-        bookings_text = "📋 *Все бронирования:*\n\n"
-        for booking in all_bookings:
-            date_parts = booking['date'].split('-')
-            display_date = f"{date_parts[2]}.{date_parts[1]}.{date_parts[0]}"
-            bookings_text += (
-                f"*{display_date} {booking['time']}*\n"
-                f"👤 Имя: {booking['name']}\n"
-                f"📞 Телефон: {booking['phone']}\n\n"
-            )
         
-        update.message.reply_text(
+        outbound.reply_text(
+            update.message,
             bookings_text,
             parse_mode='Markdown',
-            reply_markup=main_menu_keyboard()
+            reply_markup=page_markup or main_menu_keyboard()
         )
         return ConversationHandler.END
     elif text == "⏰ Свободное время":
@@ -728,7 +1125,8 @@ def handle_text_buttons(update: Update, context: CallbackContext):
     elif text == "👤 Админ панель":
         return admin_panel(update, context)
     else:
-        update.message.reply_text(
+        outbound.reply_text(
+            update.message,
             "Пожалуйста, используйте кнопки меню для навигации.",
             reply_markup=main_menu_keyboard()
         )
@@ -0,0 +1,139 @@
+import heapq
+import itertools
+import logging
+import threading
+import time as _time
+
+logger = logging.getLogger(__name__)
+
+
+class SlotHolds:
+    """Short-lived holds on time slots while a user finishes the booking form
+
+    Each user can hold at most one slot, and a slot can be held by as many
+    users as it has places left. Expiry is driven by a min-heap of deadlines
+    and processed lazily on access, so only holds that actually expired are
+    touched.
+    """
+
+    def __init__(self, ttl, clock=_time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Slot held by each user: {user_id: (date, time, token)}
+        self._by_user = {}
+        # Holders of each slot, per date: {date: {time: {user_id, ...}}}
+        self._by_date = {}
+        # Deadlines: [(expires_at, token, user_id)]; stale entries are skipped when popped
+        self._heap = []
+        self._tokens = itertools.count(1)
+        # Bumped whenever the set of holds changes, so cached renders can be invalidated
+        self._version = 0
+
+    def _expire(self, now):
+        """Drop every hold whose deadline has passed (caller holds the lock)"""
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _, token, user_id = heapq.heappop(heap)
+            current = self._by_user.get(user_id)
+            if current is not None and current[2] == token:
+                self._drop(user_id)
+
+    def _drop(self, user_id):
+        """Remove the hold of a user (caller holds the lock)"""
+        entry = self._by_user.pop(user_id, None)
+        if entry is None:
+            return None
+        date, time, _ = entry
+        self._version += 1
+        day = self._by_date.get(date)
+        if day is not None:
+            holders = day.get(time)
+            if holders is not None:
+                holders.discard(user_id)
+                if not holders:
+                    del day[time]
+            if not day:
+                del self._by_date[date]
+        return date, time
+
+    def _others(self, date, time, user_id):
+        """Count the holders of a slot other than user_id (caller holds the lock)"""
+        day = self._by_date.get(date)
+        holders = day.get(time) if day else None
+        if not holders:
+            return 0
+        return len(holders) - (user_id in holders)
+
+    def hold(self, user_id, date, time, places=1, ttl=None):
+        """Place or refresh a hold; returns False if other users hold all `places` left"""
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+
+            if self._others(date, time, user_id) >= places:
+                return False
+
+            # A user holds one slot at a time; picking another one moves the hold
+            self._drop(user_id)
+
+            token = next(self._tokens)
+            self._version += 1
+            self._by_user[user_id] = (date, time, token)
+            self._by_date.setdefault(date, {}).setdefault(time, set()).add(user_id)
+            heapq.heappush(self._heap, (now + (ttl if ttl is not None else self.ttl), token, user_id))
+            return True
+
+    def release(self, user_id):
+        """Release the hold of a user, if any"""
+        with self._lock:
+            released = self._drop(user_id)
+        if released is not None:
+            logger.info(f"Released hold of user {user_id} on {released[0]} at {released[1]}")
+        return released is not None
+
+    def held_by_others_count(self, date, time, user_id=None):
+        """Count the users other than user_id holding the slot"""
+        with self._lock:
+            self._expire(self._clock())
+            return self._others(date, time, user_id)
+
+    def held_by_others(self, date, user_id=None):
+        """Get the times on a date held by users other than user_id: {time: holders}"""
+        with self._lock:
+            self._expire(self._clock())
+            day = self._by_date.get(date)
+            if not day:
+                return {}
+            held = {}
+            for time, holders in day.items():
+                count = len(holders) - (user_id in holders)
+                if count:
+                    held[time] = count
+            return held
+
+    def held_by(self, user_id):
+        """Get the (date, time) held by a user, or None"""
+        with self._lock:
+            self._expire(self._clock())
+            entry = self._by_user.get(user_id)
+        return entry[:2] if entry is not None else None
+
+    def version(self):
+        """Get a counter that changes whenever a hold is placed, released or expires"""
+        with self._lock:
+            self._expire(self._clock())
+            return self._version
+
+    def clear(self):
+        """Drop all holds"""
+        with self._lock:
+            self._version += 1
+            self._by_user.clear()
+            self._by_date.clear()
+            self._heap.clear()
+
+    def __len__(self):
+        with self._lock:
+            self._expire(self._clock())
+            return len(self._by_user)
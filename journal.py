@@ -0,0 +1,307 @@
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = "snapshot.json"
+SEGMENT_PREFIX = "journal."
+SEGMENT_SUFFIX = ".log"
+# Suffix of segments set aside because they follow a corrupt record
+DISCARDED_SUFFIX = ".discarded"
+
+
+class JournalError(OSError):
+    """Raised when a journal record could not be made durable"""
+
+
+def _to_json(value):
+    """Write objects that know their journal form (booking records) as plain dicts"""
+    to_record = getattr(value, "to_record", None)
+    if to_record is None:
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+    return to_record()
+
+class BookingJournal:
+    """Append-only journal of booking operations with group commit and snapshots"""
+
+    def __init__(self, directory, flush_interval=0.01, snapshot_every=10000):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+
+        os.makedirs(directory, exist_ok=True)
+
+        # Records appended but not yet written: [line, ...]
+        self._buffer = []
+        # Sequence numbers: last appended and last fsynced record
+        self._appended_seq = 0
+        self._durable_seq = 0
+        # Records written to the current segment since the last snapshot
+        self._since_snapshot = 0
+        # Snapshot waiting to be written by the flusher: (segment, state)
+        self._pending_snapshot = None
+        # Background thread writing the latest snapshot
+        self._snapshot_thread = None
+
+        self._cond = threading.Condition()
+        self._closed = False
+        # Set by the flusher when it exits; records not durable by then never will be
+        self._stopped = False
+
+        self._segment = self._latest_segment()
+        self._file = self._open_segment(self._segment)
+
+        self._flusher = threading.Thread(target=self._flush_loop, name="journal-flusher", daemon=True)
+        self._flusher.start()
+
+    # Paths
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{segment:08d}{SEGMENT_SUFFIX}")
+
+    def _segments(self):
+        """List existing segment numbers in ascending order"""
+        result = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                try:
+                    result.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+                except ValueError:
+                    continue
+        return sorted(result)
+
+    def _latest_segment(self):
+        segments = self._segments()
+        return segments[-1] if segments else 1
+
+    def _open_segment(self, segment):
+        # Unbuffered, so a failed write can be cut off at a known offset
+        return open(self._segment_path(segment), "ab", buffering=0)
+
+    # Recovery
+    def load(self):
+        """Return (snapshot_state, records) needed to rebuild the store"""
+        state = None
+        first_segment = 1
+        snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            state = snapshot["state"]
+            first_segment = snapshot["segment"]
+
+        records = []
+        segments = [segment for segment in self._segments() if segment >= first_segment]
+        for i, segment in enumerate(segments):
+            if not self._read_segment(segment, records):
+                # Nothing after a corrupt record can be replayed in order, and new
+                # records must not land behind it, so continue in the truncated segment
+                for later in segments[i + 1:]:
+                    path = self._segment_path(later)
+                    os.replace(path, path + DISCARDED_SUFFIX)
+                    logger.warning(f"Discarded journal segment {later} following a corrupt record")
+                with self._cond:
+                    self._file.close()
+                    self._segment = segment
+                    self._file = self._open_segment(segment)
+                break
+
+        self._since_snapshot = len(records)
+        logger.info(f"Journal loaded: snapshot={'yes' if state is not None else 'no'}, {len(records)} records to replay")
+        return state, records
+
+    def _read_segment(self, segment, records):
+        """Append the records of a segment to records
+
+        Returns False if the segment ends in a torn or corrupt record; the
+        segment is then truncated back to its last valid record.
+        """
+        path = self._segment_path(segment)
+        valid_size = 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("unterminated record")
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+                valid_size += len(line)
+            else:
+                return True
+
+        logger.warning(f"Corrupt journal record in segment {segment} at byte {valid_size}, truncating it there")
+        with open(path, "r+b") as f:
+            f.truncate(valid_size)
+            os.fsync(f.fileno())
+        return False
+
+    # Writing
+    def append(self, record):
+        """Queue a record for the next group commit and return its sequence number"""
+        line = (json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=_to_json) + "\n").encode("utf-8")
+        with self._cond:
+            self._buffer.append(line)
+            self._appended_seq += 1
+            self._since_snapshot += 1
+            self._cond.notify_all()
+            return self._appended_seq
+
+    def wait(self, seq):
+        """Block until the record with this sequence number is on disk
+
+        Raises JournalError if the journal was closed before it could be written.
+        """
+        with self._cond:
+            while self._durable_seq < seq and not self._stopped:
+                self._cond.wait()
+            if self._durable_seq < seq:
+                raise JournalError(f"Journal record {seq} was not written")
+
+    def needs_snapshot(self):
+        """Check whether enough records accumulated to compact the journal"""
+        return self._since_snapshot >= self.snapshot_every
+
+    def compact(self, state):
+        """Start a new segment and schedule a snapshot of the given state
+
+        The caller must make sure no other record is appended between taking
+        the state and calling this method.
+        """
+        with self._cond:
+            self._segment += 1
+            self._buffer.append(None)  # Segment boundary marker for the flusher
+            self._pending_snapshot = (self._segment, state)
+            self._since_snapshot = 0
+            self._cond.notify_all()
+
+    def _flush_loop(self):
+        try:
+            self._flush_batches()
+        finally:
+            with self._cond:
+                self._stopped = True
+                self._cond.notify_all()
+
+    def _flush_batches(self):
+        while True:
+            with self._cond:
+                while not self._buffer and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._buffer:
+                    return
+            # Let concurrent writers pile into the same batch
+            if self.flush_interval:
+                self._cond_wait_interval()
+
+            with self._cond:
+                batch = self._buffer
+                self._buffer = []
+                batch_seq = self._appended_seq
+                snapshot = self._pending_snapshot
+                self._pending_snapshot = None
+
+            # Records only count as durable once written; keep retrying until then
+            delay = 0.05
+            while batch:
+                try:
+                    self._write_batch(batch)
+                except OSError as e:
+                    with self._cond:
+                        if self._closed:
+                            logger.error(f"Journal closed with {len(batch)} records unwritten: {e}")
+                            return
+                        logger.error(f"Failed to write journal, retrying in {delay:.2f} s: {e}")
+                        self._cond.wait(delay)
+                    delay = min(delay * 2, 1.0)
+            if snapshot is not None:
+                self._start_snapshot(snapshot)
+
+            with self._cond:
+                self._durable_seq = batch_seq
+                self._cond.notify_all()
+
+    def _cond_wait_interval(self):
+        with self._cond:
+            if not self._closed:
+                self._cond.wait(self.flush_interval)
+
+    def _write_batch(self, batch):
+        """Write and fsync a batch
+
+        Lines leave the batch once they are durable, so after an error a
+        retry resumes with the first line that was not written.
+        """
+        while batch:
+            if batch[0] is None:
+                # Continue in the next segment
+                next_file = self._open_segment(self._next_file_segment())
+                self._file.close()
+                self._file = next_file
+                del batch[0]
+                continue
+            end = batch.index(None) if None in batch else len(batch)
+            self._sync(batch[:end])
+            del batch[:end]
+
+    def _next_file_segment(self):
+        current = int(os.path.basename(self._file.name)[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+        return current + 1
+
+    def _sync(self, lines):
+        fd = self._file.fileno()
+        size = os.fstat(fd).st_size
+        try:
+            data = memoryview(b"".join(lines))
+            while data:
+                data = data[self._file.write(data):]
+            os.fsync(fd)
+        except OSError:
+            # Cut off a partial write so the retry does not leave a torn record behind
+            try:
+                os.ftruncate(fd, size)
+            except OSError as e:
+                logger.error(f"Failed to truncate journal after a failed write: {e}")
+            raise
+
+    def _start_snapshot(self, snapshot):
+        """Write a snapshot off the commit path so fsyncs are not held up"""
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+        self._snapshot_thread = threading.Thread(
+            target=self._write_snapshot, args=snapshot, name="journal-snapshot", daemon=True
+        )
+        self._snapshot_thread.start()
+
+    def _write_snapshot(self, segment, state):
+        """Atomically replace the snapshot and drop segments it covers"""
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"segment": segment, "state": state}, f,
+                    ensure_ascii=False, separators=(",", ":"), default=_to_json
+                )
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+
+            for old in self._segments():
+                if old < segment:
+                    os.remove(self._segment_path(old))
+        except OSError as e:
+            logger.error(f"Failed to write journal snapshot: {e}")
+            return
+        logger.info(f"Journal compacted into snapshot at segment {segment}")
+
+    def close(self):
+        """Flush outstanding records and stop the flusher thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._flusher.join()
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+        self._file.close()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Throughput and recovery time of the booking journal.
+
+For every size, fills a store backed by a fresh journal from several
+threads (each add_booking waits for its group commit, like a handler does),
+then reopens the journal and times how long rebuilding the store takes.
+
+    python journal_benchmark.py --sizes 10000,100000,1000000 --threads 64
+"""
+import argparse
+import logging
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+import config
+from data_store import DataStore
+from journal import BookingJournal
+
+
+def fill(store, count, threads):
+    """Add count bookings from several threads; returns the elapsed seconds"""
+    times = config.get_available_time_slots()
+    start = date(2020, 1, 1)
+
+    def worker(index):
+        for i in range(index, count, threads):
+            day = (start + timedelta(days=i // len(times))).isoformat()
+            store.add_booking(1000 + i % 5000, day, times[i % len(times)], "Load Test", "+380000000000")
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def open_journal(directory, args):
+    return BookingJournal(
+        directory, flush_interval=args.flush_interval, snapshot_every=args.snapshot_every
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="journal sizes to measure at")
+    parser.add_argument("--threads", type=int, default=64, help="threads adding bookings")
+    parser.add_argument("--flush-interval", type=float, default=config.JOURNAL_FLUSH_INTERVAL)
+    parser.add_argument("--snapshot-every", type=int, default=config.JOURNAL_SNAPSHOT_EVERY)
+    parser.add_argument("--dir", default=None, help="directory for the journals (default: a temp dir)")
+    args = parser.parse_args()
+
+    # Per-booking info logs would dominate the measurements
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"{'records':>10}{'writes/s':>12}{'write s':>10}{'recovery s':>12}{'recovered':>11}")
+    for count in (int(s) for s in args.sizes.split(",")):
+        directory = tempfile.mkdtemp(prefix="journal-bench-", dir=args.dir)
+        try:
+            store = DataStore(journal=open_journal(directory, args))
+            elapsed = fill(store, count, args.threads)
+            store._journal.close()
+            del store
+
+            started = time.perf_counter()
+            recovered = DataStore(journal=open_journal(directory, args))
+            recovery = time.perf_counter() - started
+            recovered._journal.close()
+
+            print(f"{count:>10}{count / elapsed:>12.0f}{elapsed:>10.2f}{recovery:>12.2f}"
+                  f"{recovered.booking_count():>11}")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
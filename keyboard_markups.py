@@ -11,25 +11,28 @@ def main_menu_keyboard():
     ]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
-def generate_dates_keyboard(dates):
-    """Generate a keyboard with available dates"""
+def generate_dates_keyboard(dates, free_counts=None):
+    """Generate a keyboard with available dates, optionally showing free slots per date"""
     keyboard = []
     for date_str in dates:
         # Format the date for display (YYYY-MM-DD to DD.MM.YYYY)
         display_date = date_str.split('-')
         display_date = f"{display_date[2]}.{display_date[1]}.{display_date[0]}"
+        if free_counts is not None and date_str in free_counts:
+            display_date = f"{display_date} ({free_counts[date_str]} своб.)"
         keyboard.append([InlineKeyboardButton(display_date, callback_data=f"date_{date_str}")])
     
     keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data="back_to_main")])
     return InlineKeyboardMarkup(keyboard)
 
-def generate_times_keyboard(times):
-    """Generate a keyboard with available times"""
+def generate_times_keyboard(times, places=None):
+    """Generate a keyboard with available times and, if given, the places left in each"""
     keyboard = []
     row = []
     
     for i, time in enumerate(times):
-        row.append(InlineKeyboardButton(time, callback_data=f"time_{time}"))
+        label = f"{time} ({places[time]})" if places else time
+        row.append(InlineKeyboardButton(label, callback_data=f"time_{time}"))
         
         # Create rows with 3 buttons each
         if (i + 1) % 3 == 0 or i == len(times) - 1:
@@ -52,6 +55,13 @@ def generate_bookings_keyboard(bookings):
     keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data="back_to_main")])
     return InlineKeyboardMarkup(keyboard)
 
+def all_bookings_page_keyboard(prev_cursor=None, next_cursor=None):
+    """Generate page navigation for the "All bookings" text listing"""
+    nav_row = pagination_row("all_page", prev_cursor, next_cursor)
+    if not nav_row:
+        return None
+    return InlineKeyboardMarkup([nav_row])
+
 def booking_actions_keyboard(booking_id):
     """Generate a keyboard with actions for a specific booking"""
     keyboard = [
@@ -64,13 +74,23 @@ def admin_menu_keyboard():
     """Generate the admin menu keyboard"""
     keyboard = [
         [InlineKeyboardButton("📋 Все бронирования", callback_data="admin_all_bookings")],
+        [InlineKeyboardButton("🗑 Массовая отмена", callback_data="admin_bulk")],
         [InlineKeyboardButton("❌ Сбросить все бронирования", callback_data="admin_reset_all")],
         [InlineKeyboardButton("⬅️ Назад", callback_data="back_to_main")]
     ]
     return InlineKeyboardMarkup(keyboard)
 
-def admin_bookings_keyboard(bookings):
-    """Generate a keyboard to display all bookings with cancel options for admin"""
+def pagination_row(prefix, prev_cursor=None, next_cursor=None):
+    """Generate a row of previous/next page buttons for a cursor-paginated list"""
+    row = []
+    if prev_cursor is not None:
+        row.append(InlineKeyboardButton("⬅️ Пред.", callback_data=f"{prefix}_prev_{prev_cursor}"))
+    if next_cursor is not None:
+        row.append(InlineKeyboardButton("След. ➡️", callback_data=f"{prefix}_next_{next_cursor}"))
+    return row
+
+def admin_bookings_keyboard(bookings, prev_cursor=None, next_cursor=None):
+    """Generate a keyboard to display a page of bookings with cancel options for admin"""
     keyboard = []
     
     for booking in bookings:
@@ -79,6 +99,10 @@ def admin_bookings_keyboard(bookings):
         button_text = f"{display_date} {booking['time']} - {booking['name']}"
         keyboard.append([InlineKeyboardButton(button_text, callback_data=f"admin_view_{booking['id']}")])
     
+    nav_row = pagination_row("admin_page", prev_cursor, next_cursor)
+    if nav_row:
+        keyboard.append(nav_row)
+    
     keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data="back_to_admin")])
     return InlineKeyboardMarkup(keyboard)
 
@@ -102,3 +126,43 @@ def admin_confirm_reset_keyboard():
         [InlineKeyboardButton("❌ Нет, отмена", callback_data="back_to_admin")]
     ]
     return InlineKeyboardMarkup(keyboard)
+
+def admin_bulk_menu_keyboard():
+    """Generate the keyboard for choosing which bookings to cancel in bulk"""
+    keyboard = [
+        [InlineKeyboardButton("📅 По дате", callback_data="bulk_mode_date")],
+        [InlineKeyboardButton("🗓 По диапазону дат", callback_data="bulk_mode_range")],
+        [InlineKeyboardButton("⏰ По слоту", callback_data="bulk_mode_slot")],
+        [InlineKeyboardButton("👤 По пользователю", callback_data="bulk_mode_user")],
+        [InlineKeyboardButton("⬅️ Назад", callback_data="back_to_admin")]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+def admin_bulk_dates_keyboard(dates, prefix, booking_counts):
+    """Generate a keyboard of dates with their booking counts for a bulk cancellation step"""
+    keyboard = []
+    for date_str in dates:
+        date_parts = date_str.split('-')
+        display_date = f"{date_parts[2]}.{date_parts[1]}.{date_parts[0]} ({booking_counts.get(date_str, 0)} бр.)"
+        keyboard.append([InlineKeyboardButton(display_date, callback_data=f"{prefix}_{date_str}")])
+    
+    keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data="admin_bulk")])
+    return InlineKeyboardMarkup(keyboard)
+
+def admin_bulk_times_keyboard(times):
+    """Generate a keyboard of booked times for cancelling one slot"""
+    keyboard = [[InlineKeyboardButton(time, callback_data=f"bulk_slot_{time}")] for time in times]
+    keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data="admin_bulk")])
+    return InlineKeyboardMarkup(keyboard)
+
+def admin_bulk_back_keyboard():
+    """Generate a keyboard that returns to the bulk cancellation menu"""
+    return InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Назад", callback_data="admin_bulk")]])
+
+def admin_bulk_confirm_keyboard():
+    """Generate a confirmation keyboard for a bulk cancellation"""
+    keyboard = [
+        [InlineKeyboardButton("✅ Да, отменить", callback_data="bulk_confirm")],
+        [InlineKeyboardButton("❌ Нет, назад", callback_data="admin_bulk")]
+    ]
+    return InlineKeyboardMarkup(keyboard)
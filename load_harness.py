@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Load harness for the bot handlers.
+
+Drives complete conversations (booking, viewing and cancelling a booking,
+admin listing) through handlers.py with synthetic Update objects and a bot
+whose network methods are stubbed out. The store is grown in stages, e.g.
+0 -> 1k -> 10k -> 100k bookings, and for every stage the harness prints
+p50/p99 latency per handler and the number of confirmed bookings per second.
+
+    python load_harness.py --threads 8 --flows 2000 --sizes 0,1000,10000,100000
+"""
+import argparse
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from telegram import CallbackQuery, Chat, Message, Update, User
+from telegram.ext import ConversationHandler
+
+import config
+import handlers
+from storage import store
+from outbound import OutboundQueue
+from utils import encode_booking_cursor
+
+# Users that only own the preloaded bookings
+BACKGROUND_USER_BASE = 10 ** 9
+
+
+class StubBot:
+    """Bot with the network methods used by the handlers replaced by no-ops"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self._message_ids = itertools.count(1)
+
+    def _call(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def send_message(self, chat_id, text, **kwargs):
+        self._call()
+        return next(self._message_ids)
+
+    def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        self._call()
+        return True
+
+    def answer_callback_query(self, callback_query_id, **kwargs):
+        self._call()
+        return True
+
+    def delete_message(self, chat_id, message_id, **kwargs):
+        self._call()
+        return True
+
+
+class SimulatedUser:
+    """Builds the updates one Telegram user would send"""
+
+    _update_ids = itertools.count(1)
+
+    def __init__(self, user_id, bot):
+        self.bot = bot
+        self.user = User(user_id, f"User{user_id}", False)
+        self.chat = Chat(user_id, 'private')
+        self.context = SimpleNamespace(bot=bot, user_data={}, chat_data={}, bot_data={})
+        self._message_ids = itertools.count(1)
+        # Message the inline keyboards are attached to
+        self.last_message = self._message()
+
+    def _message(self, text=None):
+        return Message(
+            next(self._message_ids), datetime.now(), self.chat,
+            from_user=self.user, text=text, bot=self.bot
+        )
+
+    def text(self, text):
+        return Update(next(self._update_ids), message=self._message(text))
+
+    def press(self, data):
+        query = CallbackQuery(
+            str(next(self._update_ids)), self.user, str(self.chat.id),
+            message=self.last_message, data=data, bot=self.bot
+        )
+        return Update(next(self._update_ids), callback_query=query)
+
+
+class Recorder:
+    """Per-thread handler latencies, merged when a stage ends"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.bookings = 0
+        self.rejected = 0
+
+    def call(self, handler, user, update):
+        start = time.perf_counter()
+        result = handler(update, user.context)
+        self.latencies[handler.__name__].append(time.perf_counter() - start)
+        return result
+
+
+def preload(target, dates):
+    """Add bookings on past dates until the store holds `target` bookings"""
+    times = config.get_available_time_slots()
+    count = len(store.get_all_bookings())
+    day = datetime.strptime(dates[0], "%Y-%m-%d").date()
+    while count < target:
+        day -= timedelta(days=1)
+        date = day.strftime("%Y-%m-%d")
+        for time_slot in times[:target - count]:
+            store.add_booking(BACKGROUND_USER_BASE + count, date, time_slot, "Load Test", "+380000000000")
+            count += 1
+
+
+def booking_flow(recorder, user, rng, dates):
+    """start_booking -> date_selected -> time_selected -> name -> phone -> confirm; returns the booking"""
+    recorder.call(handlers.start_booking, user, user.text("📅 Забронировать"))
+
+    for _ in range(3):
+        date = rng.choice(dates)
+        state = recorder.call(handlers.date_selected, user, user.press(f"date_{date}"))
+        if state != handlers.SELECTING_TIME:
+            continue
+
+        free = store.get_available_slots(date, config.get_time_slots(date), user.user.id)
+        if not free:
+            continue
+        time_slot = rng.choice(free)
+        state = recorder.call(handlers.time_selected, user, user.press(f"time_{time_slot}"))
+        if state != handlers.ENTERING_NAME:
+            continue
+
+        recorder.call(handlers.name_entered, user, user.text("Load Test"))
+        recorder.call(handlers.phone_entered, user, user.text("+380501234567"))
+        state = recorder.call(handlers.confirm_booking, user, user.press("confirm_booking"))
+        if state == ConversationHandler.END:
+            recorder.bookings += 1
+            for booking in store.get_bookings_for_user(user.user.id):
+                if booking['date'] == date and booking['time'] == time_slot:
+                    return booking
+        recorder.rejected += 1
+        return None
+
+    recorder.call(handlers.cancel_operation, user, user.press("cancel_operation"))
+    recorder.rejected += 1
+    return None
+
+
+def cancel_flow(recorder, user, booking):
+    """view_my_bookings -> view_booking_details -> cancel_booking"""
+    recorder.call(handlers.view_my_bookings, user, user.text("🔍 Мои бронирования"))
+    recorder.call(handlers.view_booking_details, user, user.press(f"view_{booking['id']}"))
+    recorder.call(handlers.cancel_booking, user, user.press(f"cancel_{booking['id']}"))
+
+
+def admin_flow(recorder, user):
+    """admin_panel -> all bookings -> next page -> booking details"""
+    recorder.call(handlers.admin_panel, user, user.text("👤 Админ панель"))
+    recorder.call(handlers.admin_view_all_bookings, user, user.press("admin_all_bookings"))
+    page, _, has_next = store.bookings_page(limit=config.PAGE_SIZE)
+    if has_next:
+        cursor = encode_booking_cursor(page[-1])
+        recorder.call(handlers.admin_bookings_page, user, user.press(f"admin_page_next_{cursor}"))
+    if page:
+        recorder.call(handlers.admin_view_booking_details, user, user.press(f"admin_view_{page[0]['id']}"))
+
+
+def worker(index, flows, args, bot, dates, recorder):
+    rng = random.Random(args.seed + index)
+    users = [SimulatedUser(index * args.users_per_thread + i + 1, bot) for i in range(args.users_per_thread)]
+    admin = SimulatedUser(config.ADMIN_IDS[0], bot)
+
+    for flow in range(flows):
+        if args.admin_every and flow % args.admin_every == 0:
+            admin_flow(recorder, admin)
+            continue
+        user = rng.choice(users)
+        booking = booking_flow(recorder, user, rng, dates)
+        if booking is not None:
+            cancel_flow(recorder, user, booking)
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def run_stage(size, args, bot, dates):
+    preload(size, dates)
+
+    recorders = [Recorder() for _ in range(args.threads)]
+    per_thread = args.flows // args.threads
+    threads = [
+        threading.Thread(target=worker, args=(i, per_thread, args, bot, dates, recorders[i]))
+        for i in range(args.threads)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = defaultdict(list)
+    for recorder in recorders:
+        for name, values in recorder.latencies.items():
+            latencies[name].extend(values)
+    bookings = sum(r.bookings for r in recorders)
+    rejected = sum(r.rejected for r in recorders)
+
+    print(f"\n=== {len(store.get_all_bookings())} bookings in store, "
+          f"{args.threads} threads, {per_thread * args.threads} flows ===")
+    print(f"{'handler':<28}{'calls':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for name in sorted(latencies):
+        values = sorted(latencies[name])
+        print(f"{name:<28}{len(values):>8}{percentile(values, 0.5) * 1000:>10.3f}"
+              f"{percentile(values, 0.99) * 1000:>10.3f}")
+    print(f"bookings: {bookings} confirmed, {rejected} not booked, "
+          f"{bookings / elapsed:.1f} bookings/s in {elapsed:.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--flows", type=int, default=2000, help="flows per stage, split between threads")
+    parser.add_argument("--users-per-thread", type=int, default=50)
+    parser.add_argument("--sizes", default="0,1000,10000,100000", help="store sizes to measure at")
+    parser.add_argument("--admin-every", type=int, default=20, help="every Nth flow is an admin flow (0: never)")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="seconds each stubbed API call takes")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # Per-booking info logs would dominate the measurements
+    logging.getLogger().setLevel(logging.WARNING)
+
+    bot = StubBot(latency=args.api_latency)
+
+    # Send replies through a queue without rate limits so the stub bot is the only cost
+    queue = OutboundQueue(bot, workers=4, global_rate=1e9, global_burst=1e9, chat_rate=1e9, chat_burst=1e9)
+    queue.start()
+    handlers.outbound = queue
+
+    dates = config.get_date_range()
+    for size in (int(s) for s in args.sizes.split(",")):
+        run_stage(size, args, bot, dates)
+
+    queue.stop()
+    print(f"\noutbound: {queue.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,14 @@
+import hmac
 import os
 import sys
-from flask import Flask, render_template
-from bot import start_bot, get_bot_info
+from flask import Flask, jsonify, render_template, request
+from bot import start_bot, get_bot_info, create_updater
+from outbound import outbound
+from reminders import reminders
+from render_cache import render_cache
+from webhook import WebhookIngress
+import config
+import metrics
 import threading
 
 # Create Flask app
@@ -10,16 +17,95 @@ app = Flask(__name__)
 # Add admin ID to config
 app.config['ADMIN_IDS'] = [1006518993]
 
+# Webhook ingress, created only in webhook mode
+webhook_ingress = None
+
+metrics.Gauge(
+    'webhook_queue_depth', 'Webhook updates waiting for a worker',
+    lambda: webhook_ingress.depth() if webhook_ingress is not None else 0
+)
+
 @app.route('/')
 def index():
     """Main page"""
     bot_info = get_bot_info()
     return render_template('index.html', bot_username=bot_info.get('username', 'your_bot_name'))
 
+@app.route(config.WEBHOOK_PATH, methods=['POST'])
+def telegram_webhook():
+    """Accept an update from Telegram and queue it for the workers"""
+    if webhook_ingress is None:
+        return 'Webhook mode is not enabled', 404
+
+    secret = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+    if not config.WEBHOOK_SECRET or not hmac.compare_digest(secret, config.WEBHOOK_SECRET):
+        return 'Forbidden', 403
+
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return 'Bad Request', 400
+
+    # Telegram retries non-2xx responses, so a full queue just delays the update
+    if not webhook_ingress.submit(payload):
+        return 'Too Many Requests', 429, {'Retry-After': '1'}
+
+    return '', 200
+
+@app.route('/api/availability')
+@app.route('/api/availability/<date>')
+def availability(date=None):
+    """Free slots as JSON; clients polling with If-None-Match get 304 until bookings change"""
+    if date is not None and date not in config.get_date_range():
+        return jsonify(error='Date is outside the booking window'), 404
+
+    etag, body = render_cache.availability_json(date)
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+    if request.if_none_match.contains(etag):
+        return '', 304, headers
+
+    headers['Content-Type'] = 'application/json; charset=utf-8'
+    return body, 200, headers
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Metrics in Prometheus text format"""
+    return metrics.render(), 200, {'Content-Type': metrics.CONTENT_TYPE}
+
 def run_bot():
     """Run bot in a separate thread"""
     start_bot()
 
+def start_webhook():
+    """Register the webhook with Telegram and start the update workers"""
+    global webhook_ingress
+
+    updater = create_updater()
+    webhook_ingress = WebhookIngress(
+        updater.dispatcher,
+        workers=config.BOT_WORKERS,
+        queue_size=config.WEBHOOK_QUEUE_SIZE
+    )
+    webhook_ingress.start()
+
+    updater.bot.set_webhook(
+        url=config.WEBHOOK_URL.rstrip('/') + config.WEBHOOK_PATH,
+        secret_token=config.WEBHOOK_SECRET
+    )
+    return updater
+
+def stop_webhook(updater):
+    """Finish queued updates, save conversation states and send the remaining replies"""
+    global webhook_ingress
+
+    if webhook_ingress is not None:
+        webhook_ingress.stop()
+        webhook_ingress = None
+    persistence = updater.dispatcher.persistence
+    if persistence is not None:
+        persistence.flush()
+    reminders.stop()
+    outbound.stop()
+
 if __name__ == "__main__":
     # Get current run mode from command line arguments
     mode = sys.argv[1] if len(sys.argv) > 1 else 'web'
@@ -34,6 +120,17 @@ if __name__ == "__main__":
         bot_thread.daemon = True
         bot_thread.start()
         app.run(host='0.0.0.0', port=8080)
+    elif mode == 'webhook':
+        # Run web app receiving updates through the webhook
+        if not config.TOKEN or not config.WEBHOOK_URL or not config.WEBHOOK_SECRET:
+            print("Set TELEGRAM_BOT_TOKEN, WEBHOOK_URL and WEBHOOK_SECRET to use webhook mode.")
+            sys.exit(1)
+        print("Starting web app in webhook mode...")
+        updater = start_webhook()
+        try:
+            app.run(host='0.0.0.0', port=8080, threaded=True)
+        finally:
+            stop_webhook(updater)
     else:
         # Run only web app
-        app.run(host='0.0.0.0', port=8080)
\ No newline at end of file
+        app.run(host='0.0.0.0', port=8080)
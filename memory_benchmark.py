@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Memory used per booking by the in-memory DataStore.
+
+Fills a fresh store with synthetic bookings and reports the bytes each
+booking costs, for the record alone and for the whole store. The store is
+measured twice with the same indexes: keeping a plain dict per booking, as
+it used to, and keeping a BookingRecord. Finally every part of the store is
+dropped in turn to show what it costs per booking.
+
+    python memory_benchmark.py --bookings 100000
+"""
+import argparse
+import gc
+import logging
+import random
+import tracemalloc
+from datetime import date, timedelta
+
+import config
+from booking_record import BookingRecord
+from data_store import DataStore
+
+
+def synthetic_bookings(count, seed=1):
+    rng = random.Random(seed)
+    times = config.get_available_time_slots()
+    names = [f"Name{i}" for i in range(500)]
+    start = date(2020, 1, 1)
+    for i in range(count):
+        yield (
+            1000 + i % 5000,
+            (start + timedelta(days=i // len(times))).isoformat(),
+            times[i % len(times)],
+            rng.choice(names),
+            f"+38050{i % 5000:07d}"
+        )
+
+
+def fill_store(rows):
+    store = DataStore()
+    for row in rows:
+        store.add_booking(*row)
+    return store
+
+
+def measure(build):
+    """Bytes allocated (and kept) by build()"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return used
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--bookings", type=int, default=100000)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    count = args.bookings
+    rows = list(synthetic_bookings(count))
+
+    def as_dicts():
+        return [
+            {
+                'id': i, 'date': d, 'time': t, 'user_id': u, 'name': n, 'phone': p,
+                'created_at': f"2026-01-01 12:{i % 60:02d}:{i % 59:02d}"
+            }
+            for i, (u, d, t, n, p) in enumerate(rows, 1)
+        ]
+
+    def as_records():
+        return [BookingRecord.create(i, u, d, t, n, p) for i, (u, d, t, n, p) in enumerate(rows, 1)]
+
+    def as_dict_store():
+        # Same store and indexes, with the records swapped for dicts afterwards
+        store = fill_store(rows)
+        store.bookings = {booking_id: booking.to_dict() for booking_id, booking in store.bookings.items()}
+        return store
+
+    def as_record_store():
+        return fill_store(rows)
+
+    print(f"{count} bookings")
+    for label, build in (
+        ("dict per booking", as_dicts),
+        ("BookingRecord per booking", as_records),
+        ("DataStore, dict bookings", as_dict_store),
+        ("DataStore, BookingRecords", as_record_store),
+    ):
+        print(f"  {label:<28}{measure(build) / count:>6.0f} bytes")
+
+    print("per part of the store (objects shared by several parts count for the last one dropped):")
+    for part, used in breakdown(rows):
+        print(f"  {part:<28}{used / count:>6.0f} bytes")
+
+
+def breakdown(rows):
+    """Bytes each part of a filled store frees when dropped: [(part, bytes), ...]"""
+    gc.collect()
+    tracemalloc.start()
+    store = fill_store(rows)
+    parts = []
+    for part in ('date_masks', 'slot_counts', 'booking_order', 'user_bookings', 'bookings'):
+        gc.collect()
+        before = tracemalloc.get_traced_memory()[0]
+        setattr(store, part, type(getattr(store, part))())
+        gc.collect()
+        parts.append((part, before - tracemalloc.get_traced_memory()[0]))
+    tracemalloc.stop()
+    return parts
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+import functools
+import threading
+import time as _time
+from bisect import bisect_left
+
+# Latency buckets in seconds (upper bounds, +Inf is implicit)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Cells:
+    """Per-thread accumulators: each thread only writes its own cell, reads sum them all
+
+    Updates need no lock, as no cell is ever written by two threads; the
+    lock is only taken once per thread to register its cell. Cells of
+    threads that have exited are folded into one total when read.
+    """
+
+    def __init__(self, size):
+        self._size = size
+        self._local = threading.local()
+        # Live cells: [(thread, cell), ...]
+        self._cells = []
+        # Sum of the cells of exited threads
+        self._retired = [0] * size
+        self._lock = threading.Lock()
+
+    def cell(self):
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = self._local.cell = [0] * self._size
+            with self._lock:
+                self._cells.append((threading.current_thread(), cell))
+            return cell
+
+    def totals(self):
+        with self._lock:
+            live = []
+            for thread, cell in self._cells:
+                if thread.is_alive():
+                    live.append((thread, cell))
+                else:
+                    # An exited thread never writes its cell again
+                    for i, value in enumerate(cell):
+                        self._retired[i] += value
+            self._cells = live
+            totals = list(self._retired)
+        for _, cell in live:
+            for i, value in enumerate(cell):
+                totals[i] += value
+        return totals
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def labels(self, *values):
+        """Get the child metric for one set of label values"""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def _label_text(self, values, extra=None):
+        pairs = list(zip(self.labelnames, values))
+        if extra is not None:
+            pairs.append(extra)
+        if not pairs:
+            return ''
+        inner = ','.join(f'{name}="{_escape(str(value))}"' for name, value in pairs)
+        return '{' + inner + '}'
+
+    def _default(self):
+        return self.labels()
+
+    def samples(self):
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ('_cells',)
+
+    def __init__(self):
+        self._cells = _Cells(1)
+
+    def inc(self, amount=1):
+        self._cells.cell()[0] += amount
+
+    def value(self):
+        return self._cells.totals()[0]
+
+
+class Counter(_Metric):
+    """Monotonic counter with sharded per-thread cells"""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            self._default()
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def value(self):
+        return self._default().value()
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield f'{self.name}{self._label_text(values)} {child.value()}'
+
+
+class _HistogramChild:
+    __slots__ = ('_bounds', '_cells')
+
+    def __init__(self, bounds):
+        self._bounds = bounds
+        # One count per bucket (the last is +Inf), then the count and the sum
+        self._cells = _Cells(len(bounds) + 3)
+
+    def observe(self, value):
+        cell = self._cells.cell()
+        cell[bisect_left(self._bounds, value)] += 1
+        cell[-2] += 1
+        cell[-1] += value
+
+    def snapshot(self):
+        """(cumulative bucket counts, count, sum)"""
+        totals = self._cells.totals()
+        cumulative = []
+        running = 0
+        for count in totals[:-2]:
+            running += count
+            cumulative.append(running)
+        return cumulative, totals[-2], totals[-1]
+
+
+class Histogram(_Metric):
+    """Histogram with fixed buckets and sharded per-thread cells"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            self._default()
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def samples(self):
+        bounds = [_format_bound(bound) for bound in self.buckets] + ['+Inf']
+        for values, child in list(self._children.items()):
+            cumulative, count, total = child.snapshot()
+            for bound, value in zip(bounds, cumulative):
+                yield f'{self.name}_bucket{self._label_text(values, ("le", bound))} {value}'
+            yield f'{self.name}_count{self._label_text(values)} {count}'
+            yield f'{self.name}_sum{self._label_text(values)} {total}'
+
+
+class Gauge(_Metric):
+    """Value read from a callback when the metrics are collected"""
+
+    type = 'gauge'
+
+    def __init__(self, name, documentation, function):
+        self._function = function
+        super().__init__(name, documentation)
+
+    def samples(self):
+        yield f'{self.name} {self._function()}'
+
+
+class Registry:
+    """All metrics of the process, rendered in Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_bound(bound):
+    return repr(float(bound))
+
+
+REGISTRY = Registry()
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Application metrics
+HANDLER_LATENCY = Histogram(
+    'bot_handler_latency_seconds', 'Time spent in a bot handler', ('handler',)
+)
+HANDLER_ERRORS = Counter(
+    'bot_handler_errors_total', 'Exceptions raised by bot handlers', ('handler',)
+)
+BOOKINGS_CREATED = Counter('bookings_created_total', 'Bookings created')
+BOOKINGS_CANCELLED = Counter('bookings_cancelled_total', 'Bookings cancelled')
+BOOKING_CONFLICTS = Counter(
+    'booking_conflicts_total', 'Attempts to take a slot that was already taken or held', ('stage',)
+)
+# Rate limits can hold a message back for a while, hence the longer buckets
+OUTBOUND_SEND_LATENCY = Histogram(
+    'outbound_send_seconds', 'Time from queueing a Telegram API call until it was sent', ('lane',),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+
+
+# Set while a timed handler runs on this thread
+_timing = threading.local()
+
+
+def timed_handler(handler):
+    """Record the latency and errors of a bot handler
+
+    A handler called from another timed handler (a menu button dispatching
+    to the booking flow, say) is not recorded again: the update is counted
+    once, under the handler the dispatcher called.
+    """
+    latency = HANDLER_LATENCY.labels(handler.__name__)
+    errors = HANDLER_ERRORS.labels(handler.__name__)
+
+    @functools.wraps(handler)
+    def wrapper(update, context):
+        if getattr(_timing, 'active', False):
+            return handler(update, context)
+        _timing.active = True
+        start = _time.perf_counter()
+        try:
+            return handler(update, context)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            latency.observe(_time.perf_counter() - start)
+            _timing.active = False
+
+    return wrapper
+
+
+def render():
+    """All metrics in Prometheus text format"""
+    return REGISTRY.render()
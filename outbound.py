@@ -0,0 +1,372 @@
+import heapq
+import itertools
+import logging
+import threading
+import time as _time
+from collections import deque
+from concurrent.futures import Future
+
+from telegram.error import BadRequest, RetryAfter
+
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes: interactive replies always go ahead of bulk notifications
+INTERACTIVE = 0
+BULK = 1
+
+# Send latency per lane, labelled by lane name
+_SEND_LATENCY = (metrics.OUTBOUND_SEND_LATENCY.labels('interactive'), metrics.OUTBOUND_SEND_LATENCY.labels('bulk'))
+
+# Send latencies kept for percentiles
+_LATENCY_SAMPLES = 1024
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `burst` saved up"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now):
+        """Seconds until a token is available (0 if one is available now)"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def drain(self, now, seconds):
+        """Empty the bucket so that the next token arrives after `seconds`"""
+        self._refill(now)
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+class _Request:
+    """One queued API call"""
+
+    __slots__ = ('method', 'chat_id', 'message_id', 'kwargs', 'priority', 'future', 'queued_at')
+
+    def __init__(self, method, chat_id, message_id, kwargs, priority, now):
+        self.method = method
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.kwargs = kwargs
+        self.priority = priority
+        self.future = Future()
+        self.queued_at = now
+
+
+class _Chat:
+    """Pending requests of one chat and its rate limit"""
+
+    __slots__ = ('chat_id', 'lanes', 'bucket', 'busy', 'generation', 'scheduled')
+
+    def __init__(self, chat_id, bucket):
+        self.chat_id = chat_id
+        self.lanes = (deque(), deque())
+        self.bucket = bucket
+        # A request of this chat is being sent; keeps the chat's messages in order
+        self.busy = False
+        # Bumped on every (re)scheduling; older entries in the ready lanes are skipped
+        self.generation = 0
+        # Lane the chat is scheduled for, None when it is not scheduled
+        self.scheduled = None
+
+    def best_lane(self):
+        for priority, lane in enumerate(self.lanes):
+            if lane:
+                return priority
+        return None
+
+
+class OutboundQueue:
+    """Rate-limited queue for messages sent to Telegram
+
+    Handlers enqueue sends and edits and return immediately; a small pool of
+    worker threads delivers them. Each chat has its own token bucket and a
+    FIFO per priority lane, and a global bucket caps the total rate, so a
+    burst of users or a bulk notification does not trip Telegram's flood
+    limits. A 429 pauses only the affected chat, never a handler thread.
+    Consecutive edits of the same message are merged into the last one.
+    """
+
+    def __init__(self, bot=None, workers=4, global_rate=30, global_burst=30,
+                 chat_rate=1.0, chat_burst=5, clock=_time.monotonic):
+        self.bot = bot
+        self.workers = workers
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._clock = clock
+
+        self._cond = threading.Condition()
+        self._global = TokenBucket(global_rate, global_burst, clock())
+        self._chats = {}
+        # Idle chats are swept when the table reaches this size
+        self._sweep_at = 1024
+        # Chats ready to send, per priority: deque of (chat, generation)
+        self._ready = (deque(), deque())
+        # Chats waiting for their own bucket: [(ready_at, seq, chat, generation)]
+        self._waiting = []
+        self._seq = itertools.count()
+        self._threads = []
+        self._stopping = False
+
+        # Metrics
+        self.pending = [0, 0]
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.coalesced = 0
+        self._latencies = deque(maxlen=_LATENCY_SAMPLES)
+
+    # Public API
+
+    def start(self, bot=None):
+        """Start the sender threads"""
+        if bot is not None:
+            self.bot = bot
+        with self._cond:
+            if self._threads:
+                return
+            self._stopping = False
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"outbound-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Outbound queue started with {self.workers} senders")
+
+    def stop(self, timeout=10):
+        """Send what is still queued (up to `timeout` seconds) and stop the senders"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        deadline = self._clock() + timeout
+        for thread in self._threads:
+            thread.join(max(0, deadline - self._clock()))
+        self._threads = []
+
+    def send_message(self, chat_id, text, priority=INTERACTIVE, **kwargs):
+        """Queue bot.send_message; returns a Future with the sent Message"""
+        kwargs['text'] = text
+        return self._enqueue('send_message', chat_id, None, kwargs, priority)
+
+    def reply_text(self, message, text, priority=INTERACTIVE, **kwargs):
+        """Queue a reply to the chat of `message` (like Message.reply_text)"""
+        return self.send_message(message.chat_id, text, priority=priority, **kwargs)
+
+    def answer_callback_query(self, query, priority=INTERACTIVE, **kwargs):
+        """Queue an answer to a callback query (like CallbackQuery.answer)
+
+        Answers keep their place in the chat's queue but do not use up the
+        chat's or the global message rate.
+        """
+        kwargs['callback_query_id'] = query.id
+        chat_id = query.message.chat_id if query.message is not None else query.from_user.id
+        return self._enqueue('answer_callback_query', chat_id, None, kwargs, priority)
+
+    def edit_message_text(self, message, text, priority=INTERACTIVE, **kwargs):
+        """Queue an edit of `message` (like CallbackQuery.edit_message_text)"""
+        kwargs['text'] = text
+        return self._enqueue('edit_message_text', message.chat_id, message.message_id, kwargs, priority)
+
+    def depth(self):
+        """Number of queued requests"""
+        with self._cond:
+            return sum(self.pending)
+
+    def stats(self):
+        """Queue depth, counters and send latency in seconds"""
+        with self._cond:
+            latencies = sorted(self._latencies)
+            stats = {
+                'pending_interactive': self.pending[INTERACTIVE],
+                'pending_bulk': self.pending[BULK],
+                'chats': len(self._chats),
+                'sent': self.sent,
+                'failed': self.failed,
+                'retried': self.retried,
+                'coalesced': self.coalesced,
+            }
+        if latencies:
+            stats['latency_p50'] = latencies[len(latencies) // 2]
+            stats['latency_p95'] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            stats['latency_max'] = latencies[-1]
+        return stats
+
+    # Scheduling (callers hold self._cond)
+
+    def _enqueue(self, method, chat_id, message_id, kwargs, priority):
+        with self._cond:
+            chat = self._chats.get(chat_id)
+            if chat is None:
+                if len(self._chats) >= self._sweep_at:
+                    self._sweep()
+                chat = self._chats[chat_id] = _Chat(
+                    chat_id, TokenBucket(self.chat_rate, self.chat_burst, self._clock())
+                )
+            lane = chat.lanes[priority]
+
+            # Merge into the previous edit of the same message if it has not been sent yet
+            if method == 'edit_message_text' and lane:
+                last = lane[-1]
+                if last.method == method and last.message_id == message_id:
+                    last.kwargs = kwargs
+                    self.coalesced += 1
+                    return last.future
+
+            request = _Request(method, chat_id, message_id, kwargs, priority, self._clock())
+            lane.append(request)
+            self.pending[priority] += 1
+
+            # Re-schedule when the chat is idle or waits in a lower-priority lane
+            if not chat.busy and (chat.scheduled is None or priority < chat.scheduled):
+                self._schedule(chat, self._clock())
+            return request.future
+
+    def _sweep(self):
+        """Forget idle chats whose bucket is full again"""
+        now = self._clock()
+        for chat_id, chat in list(self._chats.items()):
+            if not chat.busy and chat.scheduled is None:
+                chat.bucket.wait_time(now)
+                if chat.bucket.tokens >= chat.bucket.burst:
+                    del self._chats[chat_id]
+        self._sweep_at = max(1024, 2 * len(self._chats))
+
+    def _schedule(self, chat, now):
+        priority = chat.best_lane()
+        chat.generation += 1
+        chat.scheduled = priority
+        if priority is None:
+            return
+        delay = chat.bucket.wait_time(now)
+        if delay > 0:
+            heapq.heappush(self._waiting, (now + delay, next(self._seq), chat, chat.generation))
+        else:
+            self._ready[priority].append((chat, chat.generation))
+        self._cond.notify()
+
+    def _promote(self, now):
+        """Move chats whose bucket refilled into the ready lanes"""
+        waiting = self._waiting
+        while waiting and waiting[0][0] <= now:
+            _, _, chat, generation = heapq.heappop(waiting)
+            if chat.generation == generation:
+                self._ready[chat.best_lane()].append((chat, generation))
+
+    def _next_chat(self):
+        for ready in self._ready:
+            while ready:
+                chat, generation = ready.popleft()
+                if chat.generation == generation:
+                    return chat
+        return None
+
+    def _take(self):
+        """Wait for the next request that may be sent now; None once stopped"""
+        with self._cond:
+            while True:
+                now = self._clock()
+                self._promote(now)
+                if not any(self._ready) and self._stopping and not self._waiting:
+                    return None
+
+                timeout = None
+                if any(self._ready):
+                    timeout = self._global.wait_time(now)
+                    if timeout == 0:
+                        chat = self._next_chat()
+                        if chat is not None:
+                            request = chat.lanes[chat.best_lane()].popleft()
+                            self.pending[request.priority] -= 1
+                            chat.busy = True
+                            chat.scheduled = None
+                            chat.generation += 1
+                            # Telegram's flood limits count messages, not callback answers
+                            if request.method != 'answer_callback_query':
+                                chat.bucket.take(now)
+                                self._global.take(now)
+                            return request
+                        continue
+                if self._waiting:
+                    until_ready = self._waiting[0][0] - now
+                    timeout = until_ready if timeout is None else min(timeout, until_ready)
+                self._cond.wait(timeout)
+
+    def _done(self, request, retry_after=None):
+        with self._cond:
+            now = self._clock()
+            chat = self._chats[request.chat_id]
+            chat.busy = False
+            if retry_after is not None:
+                # Put the request back in front and pause only this chat
+                chat.lanes[request.priority].appendleft(request)
+                self.pending[request.priority] += 1
+                chat.bucket.drain(now, retry_after)
+                self.retried += 1
+            self._schedule(chat, now)
+
+    def _work(self):
+        while True:
+            request = self._take()
+            if request is None:
+                return
+
+            try:
+                if request.method == 'edit_message_text':
+                    result = self.bot.edit_message_text(
+                        chat_id=request.chat_id, message_id=request.message_id, **request.kwargs
+                    )
+                elif request.method == 'answer_callback_query':
+                    result = self.bot.answer_callback_query(**request.kwargs)
+                else:
+                    result = self.bot.send_message(chat_id=request.chat_id, **request.kwargs)
+            except RetryAfter as e:
+                logger.warning(f"Flood limit for chat {request.chat_id}, retrying in {e.retry_after}s")
+                self._done(request, retry_after=e.retry_after)
+                continue
+            except Exception as e:
+                self._done(request)
+                with self._cond:
+                    self.failed += 1
+                # Editing a message to the same content is harmless
+                if not (isinstance(e, BadRequest) and 'not modified' in str(e)):
+                    logger.error(f"Failed to {request.method} in chat {request.chat_id}: {e}")
+                request.future.set_exception(e)
+                continue
+
+            self._done(request)
+            latency = self._clock() - request.queued_at
+            _SEND_LATENCY[request.priority].observe(latency)
+            with self._cond:
+                self.sent += 1
+                self._latencies.append(latency)
+            request.future.set_result(result)
+
+
+# Global outbound queue; the bot starts it with its Bot instance
+outbound = OutboundQueue(
+    workers=config.OUTBOUND_WORKERS,
+    global_rate=config.OUTBOUND_GLOBAL_RATE,
+    global_burst=config.OUTBOUND_GLOBAL_RATE,
+    chat_rate=config.OUTBOUND_CHAT_RATE,
+    chat_burst=config.OUTBOUND_CHAT_BURST
+)
+
+metrics.Gauge('outbound_queue_depth', 'Messages waiting to be sent to Telegram', outbound.depth)
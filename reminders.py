@@ -0,0 +1,210 @@
+import heapq
+import logging
+import threading
+import time as _time
+from datetime import datetime
+from functools import lru_cache
+
+import config
+import metrics
+from storage import store
+from outbound import BULK, outbound
+
+logger = logging.getLogger(__name__)
+
+# Heap entries are single ints, (due_at << _ID_BITS) | booking_id, which keeps
+# 100k pending reminders at a few MB instead of one tuple (or timer) each
+_ID_BITS = 40
+_ID_MASK = (1 << _ID_BITS) - 1
+
+
+@lru_cache(maxsize=4096)
+def _slot_start(date, time):
+    start = time.split('-')[0]
+    return config.calendar.timestamp(datetime.strptime(f"{date} {start}", "%Y-%m-%d %H:%M"))
+
+
+def slot_start(booking):
+    """Unix time at which the booked slot starts"""
+    return _slot_start(booking['date'], booking['time'])
+
+
+def reminder_text(booking):
+    date_parts = booking['date'].split('-')
+    display_date = f"{date_parts[2]}.{date_parts[1]}.{date_parts[0]}"
+    return (
+        "⏰ *Напоминание о тренировке*\n\n"
+        f"📅 Дата: {display_date}\n"
+        f"🕒 Время: {booking['time']}\n\n"
+        "Ждём вас!"
+    )
+
+
+class ReminderScheduler:
+    """Sends a reminder `hours_before` each booked slot starts
+
+    All pending reminders live in one min-heap served by a single timer
+    thread. Cancelling only forgets the booking in `_pending`; its heap entry
+    is skipped when it comes up (and dropped early when stale entries make up
+    half of the heap).
+    """
+
+    def __init__(self, store, hours_before=2, send=None, clock=_time.time):
+        self.store = store
+        self.offset = int(hours_before * 3600)
+        self._send = send or self._send_message
+        self._clock = clock
+
+        self._cond = threading.Condition()
+        self._heap = []
+        # Due time of every pending reminder: {booking_id: due_at}
+        self._pending = {}
+        self._thread = None
+        self._stopping = False
+
+        self.sent = 0
+
+    def start(self):
+        """Schedule reminders for the stored bookings and start the timer thread"""
+        if self._thread is not None:
+            return
+        # Listen first so bookings made while rebuilding are not missed
+        self.store.add_listener(self._on_change)
+        self.rebuild()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="reminders", daemon=True)
+        self._thread.start()
+        logger.info(f"Reminder scheduler started with {len(self._pending)} pending reminders")
+
+    def stop(self):
+        """Stop the timer thread; pending reminders are rebuilt on the next start"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self.store.remove_listener(self._on_change)
+            self._thread.join()
+            self._thread = None
+
+    def rebuild(self):
+        """Reload all pending reminders from the store in one pass"""
+        now = self._clock()
+        pending = {}
+        for booking in self.store.upcoming():
+            due_at = self._due_at(booking)
+            if due_at is not None and due_at > now:
+                pending[booking['id']] = due_at
+        with self._cond:
+            # Keep reminders scheduled by listeners while the store was being read
+            pending.update(self._pending)
+            heap = [(due_at << _ID_BITS) | booking_id for booking_id, due_at in pending.items()]
+            heapq.heapify(heap)
+            self._pending = pending
+            self._heap = heap
+            self._cond.notify()
+
+    def schedule(self, booking):
+        """Schedule the reminder for a booking (skipped if it would already be due)"""
+        due_at = self._due_at(booking)
+        if due_at is None or due_at <= self._clock():
+            return
+        with self._cond:
+            self._pending[booking['id']] = due_at
+            heapq.heappush(self._heap, (due_at << _ID_BITS) | booking['id'])
+            if self._heap[0] >> _ID_BITS == due_at:
+                self._cond.notify()
+
+    def cancel(self, booking_id):
+        """Forget the reminder of a booking; its heap entry is dropped lazily"""
+        with self._cond:
+            if self._pending.pop(booking_id, None) is not None:
+                self._compact()
+
+    def cancel_many(self, booking_ids):
+        """Forget the reminders of several bookings at once"""
+        with self._cond:
+            for booking_id in booking_ids:
+                self._pending.pop(booking_id, None)
+            self._compact()
+
+    def clear(self):
+        """Forget all pending reminders"""
+        with self._cond:
+            self._pending = {}
+            self._heap = []
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _due_at(self, booking):
+        try:
+            return int(slot_start(booking)) - self.offset
+        except (KeyError, ValueError):
+            logger.warning(f"Booking {booking.get('id')} has an unrecognized slot, no reminder scheduled")
+            return None
+
+    def _compact(self):
+        """Rebuild the heap once stale entries make up half of it (caller holds the lock)"""
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._pending):
+            self._heap = [
+                (due_at << _ID_BITS) | booking_id for booking_id, due_at in self._pending.items()
+            ]
+            heapq.heapify(self._heap)
+
+    def _on_change(self, event, data):
+        if event == 'add':
+            self.schedule(data)
+        elif event == 'cancel':
+            self.cancel(data)
+        elif event == 'cancel_many':
+            self.cancel_many(data)
+        elif event == 'reset':
+            self.clear()
+
+    def _take_due(self):
+        """Wait for the next batch of due reminders; None once stopped"""
+        with self._cond:
+            while not self._stopping:
+                now = self._clock()
+                due = []
+                heap = self._heap
+                while heap and heap[0] >> _ID_BITS <= now:
+                    entry = heapq.heappop(heap)
+                    booking_id = entry & _ID_MASK
+                    if self._pending.get(booking_id) == entry >> _ID_BITS:
+                        del self._pending[booking_id]
+                        due.append(booking_id)
+                if due:
+                    return due
+                self._cond.wait((heap[0] >> _ID_BITS) - now if heap else None)
+            return None
+
+    def _run(self):
+        while True:
+            due = self._take_due()
+            if due is None:
+                return
+            for booking_id in due:
+                # The booking may have been cancelled by another process
+                booking = self.store.get_booking(booking_id)
+                if booking is None:
+                    continue
+                try:
+                    self._send(booking)
+                    self.sent += 1
+                except Exception:
+                    logger.exception(f"Failed to send reminder for booking {booking_id}")
+
+    def _send_message(self, booking):
+        outbound.send_message(
+            booking['user_id'],
+            reminder_text(booking),
+            priority=BULK,
+            parse_mode='Markdown'
+        )
+
+
+# Global reminder scheduler; the bot starts it once the outbound queue runs
+reminders = ReminderScheduler(store, hours_before=config.REMINDER_HOURS_BEFORE)
+
+metrics.Gauge('reminders_pending', 'Booking reminders waiting to be sent', reminders.__len__)
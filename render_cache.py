@@ -0,0 +1,133 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import config
+from data_store import subtract_holds
+from storage import store
+from keyboard_markups import generate_dates_keyboard, generate_times_keyboard
+from utils import format_availability
+
+logger = logging.getLogger(__name__)
+
+# Cached entries kept at most; old versions and renders fall out first
+MAX_ENTRIES = 2048
+
+
+class RenderCache:
+    """Cache for store-derived availability and the keyboards and texts rendered from it
+
+    Free slot counts and the week view are read from the store's per-date
+    availability bitmaps, which are cheap enough to query on every render.
+    Places per date for the times keyboard (holds ignored) are cached under
+    the date's store version, so a booking only invalidates its own date.
+    Holds change with every booking flow, so they are never part of a cache
+    key: they are subtracted on each read, and renders are cached by the
+    content they show.
+    """
+
+    def __init__(self, data_store, max_entries=MAX_ENTRIES):
+        self._store = data_store
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._max_entries = max_entries
+        # Versions restart with the process, so ETags are prefixed with its start time
+        self._epoch = format(int(time.time()), 'x')
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build, unchanged=None):
+        """Return the cached value for key, building it on a miss
+
+        If given, unchanged() tells after the build whether its inputs were
+        still current; a value built from data that changed meanwhile is
+        returned but not stored.
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+
+        value = build()
+        if unchanged is not None and not unchanged():
+            return value
+        with self._lock:
+            self._entries[key] = value
+            if len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def _open_places(self, date):
+        """Places not taken by bookings on a date: ((time, places), ...)"""
+        version = self._store.date_version(date)
+        return self.get(
+            ('places', date, version),
+            lambda: tuple(self._store.open_places(date, config.get_time_slots(date))),
+            lambda: self._store.date_version(date) == version
+        )
+
+    def places(self, date, user_id=None):
+        """Places user_id can still book on a date: ((time, places), ...)"""
+        return tuple(subtract_holds(self._open_places(date), self._store.holds.held_by_others(date, user_id)))
+
+    def dates_keyboard(self, user_id=None):
+        """Date selection keyboard with free slot counts"""
+        dates = config.get_date_range()
+        free = self._store.count_free_by_date(dates, user_id)
+        counts = tuple(free[date] for date in dates)
+        return self.get(
+            ('dates', dates, counts),
+            lambda: generate_dates_keyboard(dates, free)
+        )
+
+    def times(self, date, user_id=None):
+        """Free times for a date and their keyboard: (times, markup)"""
+        places = self.places(date, user_id)
+
+        def build():
+            available = tuple(time for time, _ in places)
+            return available, generate_times_keyboard(available, dict(places))
+
+        return self.get(('times', places), build)
+
+    def availability_text(self, user_id=None):
+        """Markdown text with free slots for the whole booking window"""
+        dates = config.get_date_range()
+        free = self._store.free_places_by_date(dates, user_id)
+        places = tuple(tuple(free[date]) for date in dates)
+        return self.get(
+            ('availability', dates, places),
+            lambda: format_availability(dates, free)
+        )
+
+    def availability_json(self, date=None):
+        """Serialized free slots for one date or the whole window, and its ETag: (etag, body)
+
+        The ETag is taken from the versions before the body is built, so a
+        body is never older than the ETag it is sent with.
+        """
+        dates = config.get_date_range()
+        days = [date] if date else dates
+        etag = f"{self._epoch}-{self._store.current_version()}-{self._store.holds.version()}-{dates[0] if dates else ''}"
+        if date:
+            etag += f"-{date}"
+
+        def build():
+            free = self._store.free_places_by_date(days)
+            slots = []
+            for day in days:
+                places = free[day]
+                slots.append({'date': day, 'slots': [time for time, _ in places], 'places': dict(places)})
+            body = json.dumps(slots[0] if date else {'dates': slots}, ensure_ascii=False)
+            return etag, body
+
+        return self.get(('api', etag), build)
+
+
+# Create a global render cache in front of the global store
+render_cache = RenderCache(store)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Stress test for DataStore.reserve().
+
+Two phases, run against the in-memory store (optionally journal-backed)
+or SQLite:
+
+  contention  many threads race for the same few slots; every slot must end
+              up with exactly its capacity in bookings, never more
+  scaling     threads reserve disjoint slots; prints reservations/s per
+              thread count, which should grow with the threads when
+              reservations wait on I/O (--journal or sqlite); a plain
+              in-memory store is CPU-bound and limited by the GIL
+
+Exits with status 1 if any slot was overbooked.
+
+    python reserve_stress.py --storage memory --journal --threads 1,4,16
+"""
+import argparse
+import logging
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+import config
+from data_store import DataStore
+from journal import BookingJournal
+from sqlite_store import SQLiteDataStore
+
+
+def schedule_slots(first_day, count):
+    """The first `count` (date, time) slots the schedule offers from first_day on"""
+    slots = []
+    day = first_day
+    while len(slots) < count:
+        slots.extend((day.isoformat(), time_slot) for time_slot in config.get_time_slots(day.isoformat()))
+        day += timedelta(days=1)
+    return slots[:count]
+
+
+def open_store(args, workdir):
+    if args.storage == 'sqlite':
+        return SQLiteDataStore(f"{workdir}/stress.db", pool_size=max(args.thread_counts))
+    journal = None
+    if args.journal:
+        journal = BookingJournal(workdir, flush_interval=args.flush_interval)
+    return DataStore(journal=journal)
+
+
+def close_store(store):
+    if isinstance(store, SQLiteDataStore):
+        store.close()
+    elif store._journal is not None:
+        store._journal.close()
+
+
+def run_threads(threads, target):
+    """Start threads running target(index) together; returns the elapsed seconds"""
+    barrier = threading.Barrier(threads + 1)
+
+    def run(index):
+        barrier.wait()
+        target(index)
+
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def contention(store, threads, slots, attempts):
+    """Every thread tries every slot `attempts` times; returns overbooked slots"""
+    def worker(index):
+        for _ in range(attempts):
+            for day, time_slot in slots:
+                store.reserve(10_000 + index, day, time_slot, "Stress Test", "+380000000000")
+
+    run_threads(threads, worker)
+
+    booked = Counter((booking['date'], booking['time']) for booking in store.get_all_bookings())
+    return {
+        slot: count for slot, count in booked.items()
+        if count > config.calendar.capacity(*slot)
+    }, sum(booked.values())
+
+
+def scaling(store, threads, per_thread, first_day):
+    """Threads reserve disjoint slots; returns reservations per second"""
+    slots = schedule_slots(first_day, threads * per_thread)
+
+    def worker(index):
+        for day, time_slot in slots[index * per_thread:(index + 1) * per_thread]:
+            store.reserve(20_000 + index, day, time_slot, "Stress Test", "+380000000000")
+
+    elapsed = run_threads(threads, worker)
+    return threads * per_thread / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--storage", choices=("memory", "sqlite"), default="memory")
+    parser.add_argument("--journal", action="store_true", help="back the memory store with a journal")
+    parser.add_argument("--flush-interval", type=float, default=0.002, help="journal group commit window")
+    parser.add_argument("--threads", default="1,2,4,8,16", help="thread counts for the scaling phase")
+    parser.add_argument("--contention-threads", type=int, default=16)
+    parser.add_argument("--slots", type=int, default=100, help="slots raced for in the contention phase")
+    parser.add_argument("--per-thread", type=int, default=500, help="reservations per thread when scaling")
+    args = parser.parse_args()
+    args.thread_counts = [int(s) for s in args.threads.split(",")]
+
+    # Per-booking info logs would dominate the measurements
+    logging.getLogger().setLevel(logging.WARNING)
+
+    # Days far from the real booking window; the scaling phase uses later ones
+    first_day = date(2100, 1, 1)
+    slots = schedule_slots(first_day, args.slots)
+
+    failed = False
+    workdir = tempfile.mkdtemp(prefix="reserve-stress-")
+    try:
+        store = open_store(args, workdir)
+        overbooked, total = contention(store, args.contention_threads, slots, attempts=3)
+        close_store(store)
+        print(f"contention: {args.contention_threads} threads, {len(slots)} slots, {total} bookings, "
+              f"{len(overbooked)} overbooked slots")
+        if overbooked:
+            failed = True
+            for (day_label, time_slot), count in sorted(overbooked.items())[:10]:
+                print(f"  {day_label} {time_slot}: {count} bookings")
+
+        print(f"{'threads':>8}{'reservations/s':>16}{'speedup':>9}")
+        baseline = None
+        for threads in args.thread_counts:
+            run_dir = tempfile.mkdtemp(dir=workdir)
+            store = open_store(args, run_dir)
+            rate = scaling(store, threads, args.per_thread, date(2200, 1, 1))
+            close_store(store)
+            baseline = baseline or rate
+            print(f"{threads:>8}{rate:>16.0f}{rate / baseline:>8.1f}x")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
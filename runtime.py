@@ -0,0 +1,141 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from telegram.error import NetworkError, RetryAfter, TelegramError
+
+import config
+from outbound import outbound
+from reminders import reminders
+
+logger = logging.getLogger(__name__)
+
+
+def ordering_key(update):
+    """Updates with the same key are processed strictly one after another"""
+    if update.effective_user is not None:
+        return ('user', update.effective_user.id)
+    if update.effective_chat is not None:
+        return ('chat', update.effective_chat.id)
+    return ('update', update.update_id)
+
+
+class AsyncUpdateRuntime:
+    """Asyncio event loop that polls Telegram and processes updates concurrently
+
+    Every update runs as its own task. Tasks of the same user are chained, so
+    one user's updates keep their order while different users are processed
+    in parallel. python-telegram-bot 13 handlers are synchronous, so the
+    dispatcher call itself runs on a small fixed thread pool. Handlers do not
+    wait on Telegram: replies, edits and callback answers are queued on
+    `outbound`, so a pool thread is busy only for the handler's own work. The
+    loop keeps lightweight tasks for waiting updates, and at most
+    `max_in_flight` updates are accepted before polling pauses.
+    """
+
+    def __init__(self, dispatcher, workers=4, max_in_flight=512, poll_timeout=30):
+        self.dispatcher = dispatcher
+        self.bot = dispatcher.bot
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        self.poll_timeout = poll_timeout
+
+        # Last task per ordering key: {key: asyncio.Task}
+        self._lanes = {}
+        self._executor = None
+        self._in_flight = None
+        self._stopping = None
+
+    def stop(self):
+        """Ask the polling loop to finish after the current long poll"""
+        if self._stopping is not None:
+            self._stopping.set()
+
+    def submit(self, update):
+        """Schedule an update behind the previous update with the same key"""
+        key = ordering_key(update)
+        previous = self._lanes.get(key)
+        task = asyncio.get_running_loop().create_task(self._process(update, previous))
+        self._lanes[key] = task
+
+        def forget(done, key=key):
+            if self._lanes.get(key) is done:
+                del self._lanes[key]
+
+        task.add_done_callback(forget)
+        return task
+
+    async def _process(self, update, previous):
+        try:
+            if previous is not None:
+                await asyncio.wait([previous])
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._executor, self.dispatcher.process_update, update)
+        except Exception:
+            logger.exception(f"Failed to process update {update.update_id}")
+        finally:
+            self._in_flight.release()
+
+    async def _get_updates(self, offset):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None,
+            partial(self.bot.get_updates, offset=offset, timeout=self.poll_timeout)
+        )
+
+    async def run(self):
+        """Poll for updates until stop() is called or the task is cancelled"""
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='update-worker')
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self._stopping = asyncio.Event()
+
+        # Polling and webhooks are exclusive on Telegram's side
+        await asyncio.get_running_loop().run_in_executor(None, self.bot.delete_webhook)
+
+        offset = None
+        backoff = 1
+        try:
+            while not self._stopping.is_set():
+                try:
+                    updates = await self._get_updates(offset)
+                    backoff = 1
+                except RetryAfter as e:
+                    await asyncio.sleep(e.retry_after)
+                    continue
+                except (NetworkError, TelegramError) as e:
+                    logger.warning(f"Polling failed: {e}; retrying in {backoff}s")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30)
+                    continue
+
+                for update in updates:
+                    offset = update.update_id + 1
+                    # Backpressure: stop reading new updates while too many are pending
+                    await self._in_flight.acquire()
+                    self.submit(update)
+        finally:
+            pending = list(self._lanes.values())
+            if pending:
+                await asyncio.wait(pending)
+            self._executor.shutdown(wait=True)
+
+
+def run_async_runtime(updater):
+    """Run the dispatcher of an Updater on the asyncio runtime until interrupted"""
+    runtime = AsyncUpdateRuntime(
+        updater.dispatcher,
+        workers=config.BOT_WORKERS,
+        max_in_flight=config.BOT_MAX_IN_FLIGHT
+    )
+    try:
+        asyncio.run(runtime.run())
+    except KeyboardInterrupt:
+        logger.info("Stopping bot...")
+    finally:
+        persistence = updater.dispatcher.persistence
+        if persistence is not None:
+            persistence.flush()
+        updater.dispatcher.stop()
+        reminders.stop()
+        outbound.stop()
@@ -0,0 +1,161 @@
+import json
+from datetime import date as _date, timedelta
+from functools import lru_cache
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+
+class ScheduleError(ValueError):
+    """Raised when a schedule definition cannot be compiled"""
+
+
+class DaySchedule:
+    """Slots of one day: labels in display order, a set for lookups and their bitmap"""
+
+    __slots__ = ('slots', 'times', 'mask')
+
+    def __init__(self, slots, bits):
+        self.slots = slots
+        self.times = frozenset(slots)
+        self.mask = 0
+        for time in slots:
+            self.mask |= bits[time]
+
+
+def _minutes(value):
+    try:
+        hours, minutes = value.split(':')
+        total = int(hours) * 60 + int(minutes)
+    except (AttributeError, ValueError):
+        raise ScheduleError(f"Invalid time {value!r}, expected HH:MM")
+    if not 0 <= total <= 24 * 60:
+        raise ScheduleError(f"Invalid time {value!r}")
+    return total
+
+
+def _label(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _parse_date(value):
+    try:
+        return _date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ScheduleError(f"Invalid date {value!r}, expected YYYY-MM-DD")
+
+
+def _slot_labels(periods, slot_minutes):
+    """Slot labels ('HH:MM-HH:MM') for a list of opening periods"""
+    labels = []
+    for period in periods:
+        length = int(period.get('slot_minutes', slot_minutes))
+        if length <= 0:
+            raise ScheduleError(f"Invalid slot length {length}")
+        start, end = _minutes(period['start']), _minutes(period['end'])
+        # Only whole slots that end by closing time
+        while start + length <= end:
+            labels.append(f"{_label(start)}-{_label(start + length)}")
+            start += length
+    return labels
+
+
+def _weekdays(key):
+    """Weekday numbers for 'mon', 'sat-sun' or 'mon-fri'"""
+    try:
+        first, _, last = key.lower().partition('-')
+        first = WEEKDAYS.index(first)
+        last = WEEKDAYS.index(last) if last else first
+    except ValueError:
+        raise ScheduleError(f"Invalid weekday {key!r}, expected e.g. 'mon' or 'mon-fri'")
+    if last < first:
+        raise ScheduleError(f"Invalid weekday range {key!r}")
+    return range(first, last + 1)
+
+
+def _date_keys(key):
+    """Dates for 'YYYY-MM-DD' or 'YYYY-MM-DD..YYYY-MM-DD'"""
+    first, _, last = key.partition('..')
+    day, last = _parse_date(first), _parse_date(last or first)
+    if last < day:
+        raise ScheduleError(f"Invalid date range {key!r}")
+    while day <= last:
+        yield day.isoformat()
+        day += timedelta(days=1)
+
+
+class Schedule:
+    """Opening hours compiled into per-weekday slot tables and an exception index
+
+    A definition looks like:
+
+        {
+            "slot_minutes": 60,
+            "days": {"mon-fri": [{"start": "09:00", "end": "21:00"}],
+                     "sat-sun": [{"start": "10:00", "end": "16:00", "slot_minutes": 90}]},
+            "dates": {"2026-12-24": [{"start": "09:00", "end": "14:00"}]},
+            "closed": ["2026-12-25", "2026-12-31..2027-01-02"]
+        }
+
+    Weekdays missing from "days" are closed. Every slot label any day uses
+    gets a bit in `slots`, so per-day masks line up with the store's bitmaps.
+    Looking up a date is a dict read (exceptions) or a cached weekday lookup.
+    """
+
+    def __init__(self, definition):
+        slot_minutes = int(definition.get('slot_minutes', 60))
+
+        weekday_slots = [[] for _ in WEEKDAYS]
+        for key, periods in definition.get('days', {}).items():
+            labels = _slot_labels(periods, slot_minutes)
+            for weekday in _weekdays(key):
+                weekday_slots[weekday] = labels
+
+        exception_slots = {}
+        for key, periods in definition.get('dates', {}).items():
+            labels = _slot_labels(periods, slot_minutes)
+            for day in _date_keys(key):
+                exception_slots[day] = labels
+        for key in definition.get('closed', ()):
+            for day in _date_keys(key):
+                exception_slots[day] = []
+
+        # All labels in start order; a label's bit is its position here
+        every = {label for labels in weekday_slots for label in labels}
+        every.update(label for labels in exception_slots.values() for label in labels)
+        self.slots = tuple(sorted(every))
+        bits = {time: 1 << i for i, time in enumerate(self.slots)}
+
+        self._weekdays = tuple(DaySchedule(tuple(labels), bits) for labels in weekday_slots)
+        self._exceptions = {day: DaySchedule(tuple(labels), bits) for day, labels in exception_slots.items()}
+        self.day = lru_cache(maxsize=4096)(self._day)
+
+    @classmethod
+    def hourly(cls, start_hour, end_hour):
+        """Same one-hour slots every day"""
+        return cls({
+            'slot_minutes': 60,
+            'days': {'mon-sun': [{'start': f"{start_hour:02d}:00", 'end': f"{end_hour:02d}:00"}]}
+        })
+
+    @classmethod
+    def load(cls, path):
+        """Compile the schedule definition in a JSON file"""
+        with open(path, encoding='utf-8') as f:
+            try:
+                definition = json.load(f)
+            except ValueError as e:
+                raise ScheduleError(f"Invalid schedule file {path}: {e}")
+        return cls(definition)
+
+    def _day(self, date):
+        day = self._exceptions.get(date)
+        if day is None:
+            day = self._weekdays[_parse_date(date).weekday()]
+        return day
+
+    def slots_on(self, date):
+        """Slot labels of a 'YYYY-MM-DD' date in display order (empty when closed)"""
+        return self.day(date).slots
+
+    def is_open(self, date):
+        return bool(self.day(date).slots)
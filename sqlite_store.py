@@ -0,0 +1,403 @@
+import logging
+import queue
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+
+import config
+import metrics
+from data_store import DataStore
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS bookings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL,
+        time TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        phone TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_bookings_date_time ON bookings (date, time)",
+    "CREATE INDEX IF NOT EXISTS idx_bookings_user_date ON bookings (user_id, date, time)",
+    # Bookings per slot, kept by triggers so capacity checks never count rows
+    """
+    CREATE TABLE IF NOT EXISTS slot_counts (
+        date TEXT NOT NULL,
+        time TEXT NOT NULL,
+        booked INTEGER NOT NULL,
+        PRIMARY KEY (date, time)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS bookings_count_insert AFTER INSERT ON bookings
+    BEGIN
+        INSERT INTO slot_counts (date, time, booked) VALUES (NEW.date, NEW.time, 1)
+        ON CONFLICT (date, time) DO UPDATE SET booked = booked + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS bookings_count_delete AFTER DELETE ON bookings
+    BEGIN
+        UPDATE slot_counts SET booked = booked - 1 WHERE date = OLD.date AND time = OLD.time;
+        DELETE FROM slot_counts WHERE date = OLD.date AND time = OLD.time AND booked <= 0;
+    END
+    """,
+    # Change counters in the database, so caches in every process sharing the
+    # file see each other's writes: one for the whole store and one per date
+    """
+    CREATE TABLE IF NOT EXISTS store_version (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        version INTEGER NOT NULL
+    )
+    """,
+    "INSERT OR IGNORE INTO store_version (id, version) VALUES (0, 0)",
+    """
+    CREATE TABLE IF NOT EXISTS date_versions (
+        date TEXT PRIMARY KEY,
+        version INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS bookings_version_insert AFTER INSERT ON bookings
+    BEGIN
+        UPDATE store_version SET version = version + 1 WHERE id = 0;
+        INSERT INTO date_versions (date, version) VALUES (NEW.date, (SELECT version FROM store_version))
+        ON CONFLICT (date) DO UPDATE SET version = excluded.version;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS bookings_version_delete AFTER DELETE ON bookings
+    BEGIN
+        UPDATE store_version SET version = version + 1 WHERE id = 0;
+        INSERT INTO date_versions (date, version) VALUES (OLD.date, (SELECT version FROM store_version))
+        ON CONFLICT (date) DO UPDATE SET version = excluded.version;
+    END
+    """,
+)
+
+# Statements are kept as constants so sqlite3's per-connection statement cache reuses them
+INSERT_BOOKING = (
+    "INSERT INTO bookings (date, time, user_id, name, phone, created_at) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+DELETE_BOOKING = "DELETE FROM bookings WHERE id = ?"
+DELETE_ALL = "DELETE FROM bookings"
+RESET_SEQUENCE = "DELETE FROM sqlite_sequence WHERE name = 'bookings'"
+COUNT_BOOKINGS = "SELECT COUNT(*) FROM bookings"
+SELECT_BOOKING = "SELECT * FROM bookings WHERE id = ?"
+SELECT_FOR_USER = "SELECT * FROM bookings WHERE user_id = ? ORDER BY date, time, id"
+SELECT_UPCOMING_FOR_USER = (
+    "SELECT * FROM bookings WHERE user_id = ? AND (date, time) >= (?, ?) ORDER BY date, time, id"
+)
+SELECT_ALL = "SELECT * FROM bookings ORDER BY date, time, id"
+SELECT_BETWEEN = "SELECT * FROM bookings WHERE date BETWEEN ? AND ? ORDER BY date, time, id"
+SELECT_UPCOMING = (
+    "SELECT * FROM bookings WHERE (date, time) >= (?, ?) ORDER BY date, time, id LIMIT ?"
+)
+SELECT_PAGE_FIRST = "SELECT * FROM bookings ORDER BY date, time, id LIMIT ?"
+SELECT_PAGE_AFTER = (
+    "SELECT * FROM bookings WHERE (date, time, id) > (?, ?, ?) ORDER BY date, time, id LIMIT ?"
+)
+SELECT_PAGE_BEFORE = (
+    "SELECT * FROM bookings WHERE (date, time, id) < (?, ?, ?) "
+    "ORDER BY date DESC, time DESC, id DESC LIMIT ?"
+)
+SELECT_ANY_BEFORE = "SELECT 1 FROM bookings WHERE (date, time, id) < (?, ?, ?) LIMIT 1"
+SELECT_ANY_AFTER = "SELECT 1 FROM bookings WHERE (date, time, id) > (?, ?, ?) LIMIT 1"
+SELECT_SLOT = "SELECT * FROM bookings WHERE date = ? AND time = ?"
+DELETE_SLOT = "DELETE FROM bookings WHERE date = ? AND time = ?"
+DELETE_BETWEEN = "DELETE FROM bookings WHERE date BETWEEN ? AND ?"
+DELETE_UPCOMING_FOR_USER = "DELETE FROM bookings WHERE user_id = ? AND (date, time) >= (?, ?)"
+SELECT_SLOT_COUNT = "SELECT booked FROM slot_counts WHERE date = ? AND time = ?"
+SELECT_COUNTS_ON_DATE = "SELECT time, booked FROM slot_counts WHERE date = ?"
+SELECT_STORE_VERSION = "SELECT version FROM store_version"
+SELECT_DATE_VERSION = "SELECT version FROM date_versions WHERE date = ?"
+SELECT_COUNT_BETWEEN = "SELECT COALESCE(SUM(booked), 0) FROM slot_counts WHERE date BETWEEN ? AND ?"
+
+
+class SQLiteDataStore(DataStore):
+    """DataStore that keeps bookings in an SQLite database instead of process memory"""
+
+    def __init__(self, path, pool_size=4):
+        super().__init__()
+        self.path = path
+
+        # Small pool of connections shared by handler threads
+        self._pool = queue.Queue(maxsize=pool_size)
+        for _ in range(pool_size):
+            self._pool.put(self._connect())
+
+        with self._connection() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+        logger.info(f"SQLite storage opened at {path}")
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=64
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        """Borrow a connection from the pool"""
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def add_booking(self, user_id, date, time, name, phone):
+        """Add a new booking to the database"""
+        created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._connection() as conn:
+            cursor = conn.execute(INSERT_BOOKING, (date, time, user_id, name, phone, created_at))
+            booking_id = cursor.lastrowid
+
+        self._bump()
+        metrics.BOOKINGS_CREATED.inc()
+        self._notify('add', {
+            'id': booking_id, 'date': date, 'time': time, 'user_id': user_id,
+            'name': name, 'phone': phone, 'created_at': created_at
+        })
+        logger.info(f"Added booking {booking_id} for user {user_id} on {date} at {time}")
+        return booking_id
+
+    def reserve(self, user_id, date, time, name, phone):
+        """Atomically book a slot if it is still free
+
+        The check and the insert run in one write transaction, so this also
+        holds across processes sharing the database file.
+        """
+        places = config.calendar.capacity(date, time) - self.holds.held_by_others_count(date, time, user_id)
+        if places <= 0:
+            metrics.BOOKING_CONFLICTS.labels('reserve').inc()
+            logger.info(f"Slot {date} {time} is held by other users, reservation for user {user_id} rejected")
+            return None
+        
+        created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._slot_lock(date, time), self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(SELECT_SLOT_COUNT, (date, time)).fetchone()
+                if row is not None and row[0] >= places:
+                    conn.execute("ROLLBACK")
+                    metrics.BOOKING_CONFLICTS.labels('reserve').inc()
+                    logger.info(f"Slot {date} {time} is full, reservation for user {user_id} rejected")
+                    return None
+                booking_id = conn.execute(
+                    INSERT_BOOKING, (date, time, user_id, name, phone, created_at)
+                ).lastrowid
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+
+        self._bump()
+        metrics.BOOKINGS_CREATED.inc()
+        self.holds.release(user_id)
+        self._notify('add', {
+            'id': booking_id, 'date': date, 'time': time, 'user_id': user_id,
+            'name': name, 'phone': phone, 'created_at': created_at
+        })
+        logger.info(f"Added booking {booking_id} for user {user_id} on {date} at {time}")
+        return booking_id
+
+    def get_bookings_for_user(self, user_id):
+        """Get all bookings for a specific user in chronological order"""
+        with self._connection() as conn:
+            return [dict(row) for row in conn.execute(SELECT_FOR_USER, (user_id,))]
+
+    def upcoming_for_user(self, user_id, now=None):
+        """Get the bookings of a user whose slot has not started yet, soonest first"""
+        now = now or config.calendar.now()
+        params = (user_id, now.strftime("%Y-%m-%d"), now.strftime("%H:%M"))
+        with self._connection() as conn:
+            return [dict(row) for row in conn.execute(SELECT_UPCOMING_FOR_USER, params)]
+
+    def get_all_bookings(self):
+        """Get all bookings in the system in chronological order"""
+        with self._connection() as conn:
+            return [dict(row) for row in conn.execute(SELECT_ALL)]
+
+    def bookings_between(self, start, end):
+        """Get bookings with dates from start to end inclusive, in chronological order"""
+        with self._connection() as conn:
+            return [dict(row) for row in conn.execute(SELECT_BETWEEN, (start, end))]
+
+    def upcoming(self, limit=None, now=None):
+        """Get bookings whose slot has not started yet, soonest first"""
+        now = now or config.calendar.now()
+        params = (now.strftime("%Y-%m-%d"), now.strftime("%H:%M"), -1 if limit is None else limit)
+        with self._connection() as conn:
+            return [dict(row) for row in conn.execute(SELECT_UPCOMING, params)]
+
+    def bookings_page(self, after=None, before=None, limit=10):
+        """Get one page of bookings in chronological order, starting from a cursor"""
+        with self._connection() as conn:
+            if before is not None:
+                rows = conn.execute(SELECT_PAGE_BEFORE, (*before, limit)).fetchall()
+                rows.reverse()
+            elif after is not None:
+                rows = conn.execute(SELECT_PAGE_AFTER, (*after, limit)).fetchall()
+            else:
+                rows = conn.execute(SELECT_PAGE_FIRST, (limit,)).fetchall()
+
+            if not rows:
+                return [], False, False
+            first, last = rows[0], rows[-1]
+            has_prev = conn.execute(
+                SELECT_ANY_BEFORE, (first['date'], first['time'], first['id'])
+            ).fetchone() is not None
+            has_next = conn.execute(
+                SELECT_ANY_AFTER, (last['date'], last['time'], last['id'])
+            ).fetchone() is not None
+        return [dict(row) for row in rows], has_prev, has_next
+
+    def cancel_booking(self, booking_id):
+        """Cancel a booking by ID"""
+        with self._connection() as conn:
+            cursor = conn.execute(DELETE_BOOKING, (booking_id,))
+        if cursor.rowcount == 0:
+            return False
+
+        self._bump()
+        metrics.BOOKINGS_CANCELLED.inc()
+        self._notify('cancel', booking_id)
+        logger.info(f"Cancelled booking {booking_id}")
+        return True
+
+    def _cancel_matching(self, select_sql, delete_sql, params):
+        """Cancel the rows a query selects in one transaction; returns the summary"""
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                removed = [dict(row) for row in conn.execute(select_sql, params)]
+                if removed:
+                    conn.execute(delete_sql, params)
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+
+        if removed:
+            self._bump()
+        return self._cancelled(removed)
+
+    def cancel_bookings(self, booking_ids):
+        """Cancel several bookings by ID in one transaction"""
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                removed = []
+                for booking_id in booking_ids:
+                    row = conn.execute(SELECT_BOOKING, (booking_id,)).fetchone()
+                    if row is not None:
+                        conn.execute(DELETE_BOOKING, (booking_id,))
+                        removed.append(dict(row))
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+
+        if removed:
+            self._bump()
+        return self._cancelled(removed)
+
+    def cancel_bookings_between(self, start, end):
+        """Cancel every booking with a date from start to end inclusive"""
+        return self._cancel_matching(SELECT_BETWEEN, DELETE_BETWEEN, (start, end))
+
+    def cancel_bookings_for_user(self, user_id):
+        """Cancel every upcoming booking of a user"""
+        now = config.calendar.now()
+        params = (user_id, now.strftime("%Y-%m-%d"), now.strftime("%H:%M"))
+        return self._cancel_matching(SELECT_UPCOMING_FOR_USER, DELETE_UPCOMING_FOR_USER, params)
+
+    def cancel_slot(self, date, time):
+        """Cancel the bookings of one slot"""
+        return self._cancel_matching(SELECT_SLOT, DELETE_SLOT, (date, time))
+
+    def reset_bookings(self):
+        """Remove all bookings and reset the ID counter"""
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(DELETE_ALL)
+                conn.execute(RESET_SEQUENCE)
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+
+        self._bump()
+        self._notify('reset')
+        logger.info("All bookings have been reset")
+
+    def get_booking(self, booking_id):
+        """Get a single booking by ID"""
+        with self._connection() as conn:
+            row = conn.execute(SELECT_BOOKING, (booking_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def booking_count(self):
+        """Number of stored bookings"""
+        with self._connection() as conn:
+            return conn.execute(COUNT_BOOKINGS).fetchone()[0]
+
+    def count_on(self, date):
+        """Number of bookings on a date"""
+        return self.count_between(date, date)
+
+    def count_between(self, start, end):
+        """Number of bookings with dates from start to end inclusive"""
+        with self._connection() as conn:
+            return conn.execute(SELECT_COUNT_BETWEEN, (start, end)).fetchone()[0]
+
+    def current_version(self):
+        """Get a value that changes whenever any booking changes, in any process"""
+        with self._connection() as conn:
+            return conn.execute(SELECT_STORE_VERSION).fetchone()[0]
+
+    def date_version(self, date):
+        """Get a value that changes whenever the bookings on a date change, in any process"""
+        with self._connection() as conn:
+            row = conn.execute(SELECT_DATE_VERSION, (date,)).fetchone()
+        return row[0] if row is not None else 0
+
+    def _booked_count(self, date, time):
+        """Get the number of bookings in a slot"""
+        with self._connection() as conn:
+            row = conn.execute(SELECT_SLOT_COUNT, (date, time)).fetchone()
+        return row[0] if row is not None else 0
+
+    def _booked_counts(self, date):
+        """Get the number of bookings per booked time on a date: {time: bookings}"""
+        with self._connection() as conn:
+            return dict(conn.execute(SELECT_COUNTS_ON_DATE, (date,)).fetchall())
+
+    def _booked_mask(self, date):
+        """Get the bitmap of full configured slots on a date"""
+        mask = 0
+        for time, booked in self._booked_counts(date).items():
+            if booked >= config.calendar.capacity(date, time):
+                mask |= self._slot_bits.get(time, 0)
+        return mask
+
+    def close(self):
+        """Close all pooled connections"""
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
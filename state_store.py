@@ -0,0 +1,131 @@
+import logging
+import threading
+import time as _time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore:
+    """Bounded store for per-user conversation state
+
+    Entries are kept in least-recently-used order. An entry idle for longer
+    than `ttl` seconds is dropped lazily when it is read, and every
+    `sweep_every` writes the oldest entries are swept until a live one is
+    found, so the sweep only touches entries that are actually expired.
+    When the store is full the least recently used entry is evicted.
+    """
+
+    def __init__(self, max_size=10000, ttl=3600, sweep_every=100, clock=_time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.sweep_every = sweep_every
+        self._clock = clock
+        self._lock = threading.Lock()
+        # {user_id: (value, last_access)}, least recently used first
+        self._entries = OrderedDict()
+        self._writes = 0
+        # Optional callback(user_id) invoked after a state is set or removed
+        self.listener = None
+
+        # Counters for sizing the store in production
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _expired(self, last_access, now):
+        return self.ttl is not None and now - last_access > self.ttl
+
+    def _sweep(self, now):
+        """Drop expired entries from the idle end (caller holds the lock)"""
+        entries = self._entries
+        while entries:
+            user_id, (_, last_access) = next(iter(entries.items()))
+            if not self._expired(last_access, now):
+                break
+            del entries[user_id]
+            self.expirations += 1
+
+    def get(self, user_id, default=None):
+        """Get the state of a user, refreshing its idle timer"""
+        with self._lock:
+            now = self._clock()
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return default
+            if self._expired(entry[1], now):
+                del self._entries[user_id]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._entries[user_id] = (entry[0], now)
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, user_id):
+        """Get the state of a user without touching counters or LRU order"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or self._expired(entry[1], self._clock()):
+                return None
+            return entry[0]
+
+    def set(self, user_id, value, notify=True):
+        """Store the state of a user, evicting the least recently used one if full"""
+        with self._lock:
+            now = self._clock()
+            self._entries[user_id] = (value, now)
+            self._entries.move_to_end(user_id)
+
+            self._writes += 1
+            if self._writes % self.sweep_every == 0:
+                self._sweep(now)
+
+            while len(self._entries) > self.max_size:
+                evicted, _ = self._entries.popitem(last=False)
+                self.evictions += 1
+                logger.debug(f"Evicted conversation state of user {evicted}")
+
+        if notify and self.listener is not None:
+            self.listener(user_id)
+
+    def pop(self, user_id, default=None):
+        """Remove and return the state of a user"""
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return default
+
+        if self.listener is not None:
+            self.listener(user_id)
+        return entry[0]
+
+    def sweep(self):
+        """Drop all expired entries now"""
+        with self._lock:
+            self._sweep(self._clock())
+
+    def stats(self):
+        """Get size and hit/miss/eviction counters"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+    def __contains__(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            return entry is not None and not self._expired(entry[1], self._clock())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
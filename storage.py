@@ -0,0 +1,27 @@
+import config
+import metrics
+from data_store import DataStore
+from journal import BookingJournal
+from sqlite_store import SQLiteDataStore
+
+
+def create_store():
+    """Create the data store configured for this process"""
+    if config.STORAGE_BACKEND == 'sqlite':
+        return SQLiteDataStore(config.SQLITE_PATH, pool_size=config.SQLITE_POOL_SIZE)
+
+    journal = None
+    if config.JOURNAL_DIR:
+        journal = BookingJournal(
+            config.JOURNAL_DIR,
+            flush_interval=config.JOURNAL_FLUSH_INTERVAL,
+            snapshot_every=config.JOURNAL_SNAPSHOT_EVERY
+        )
+    return DataStore(journal=journal)
+
+# Create a global instance of the data store
+store = create_store()
+
+metrics.Gauge('bookings_stored', 'Bookings in the store', store.booking_count)
+metrics.Gauge('conversation_states', 'Users with conversation state in memory', lambda: len(store.user_states))
+metrics.Gauge('slot_holds', 'Slots held by users who have not confirmed yet', lambda: len(store.holds))
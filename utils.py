@@ -46,3 +46,40 @@ def format_booking_info(booking):
         f"📞 Телефон: {booking['phone']}\n"
         f"🕒 Создано: {booking['created_at']}"
     )
+
+def encode_booking_cursor(booking):
+    """
+    Encode the chronological key of a booking for use in callback data
+    """
+    return f"{booking['date']}|{booking['time']}|{booking['id']}"
+
+def decode_booking_cursor(cursor):
+    """
+    Decode a cursor produced by encode_booking_cursor into (date, time, id)
+    """
+    date, time, booking_id = cursor.split('|')
+    return date, time, int(booking_id)
+
+def format_availability(dates, free_slots):
+    """
+    Format free time slots for several dates as Markdown text
+
+    free_slots maps each date to [(time, places left), ...]
+    """
+    availability_text = "⏰ *Доступное время для бронирования:*\n\n"
+    
+    for date in dates:
+        available_slots = free_slots.get(date, [])
+        display_date = format_date_for_display(date)
+        
+        if available_slots:
+            # Format the slots in groups of 3 for readability
+            labels = [f"{time} ({places})" for time, places in available_slots]
+            slot_groups = [labels[i:i+3] for i in range(0, len(labels), 3)]
+            formatted_slots = '\n'.join([', '.join(group) for group in slot_groups])
+            
+            availability_text += f"📅 *{display_date}*:\n{formatted_slots}\n\n"
+        else:
+            availability_text += f"📅 *{display_date}*: Нет свободных слотов\n\n"
+    
+    return availability_text
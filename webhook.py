@@ -0,0 +1,96 @@
+import logging
+import queue
+import threading
+
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+# Update types that carry the sender under "from"
+_SENDER_FIELDS = (
+    'message', 'edited_message', 'callback_query', 'inline_query',
+    'chosen_inline_result', 'shipping_query', 'pre_checkout_query', 'my_chat_member', 'chat_member'
+)
+
+
+def _sender_id(payload):
+    """Find the user ID of a raw update without building the Update object"""
+    for field in _SENDER_FIELDS:
+        section = payload.get(field)
+        if section and 'from' in section:
+            return section['from'].get('id')
+    return payload.get('update_id')
+
+
+class WebhookIngress:
+    """Bounded queues of incoming webhook updates drained by a pool of worker threads
+
+    Updates are sharded by sender, so each user's updates are handled by one
+    worker in arrival order. submit() never blocks: when the shard is full it
+    returns False and the caller should ask Telegram to retry later.
+    """
+
+    def __init__(self, dispatcher, workers=4, queue_size=1000):
+        self.dispatcher = dispatcher
+        self.bot = dispatcher.bot
+        per_worker = max(1, queue_size // workers)
+        self._queues = [queue.Queue(maxsize=per_worker) for _ in range(workers)]
+        self._threads = []
+
+        # Counters for monitoring
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self._counter_lock = threading.Lock()
+
+    def start(self):
+        """Start the worker threads"""
+        for index, updates in enumerate(self._queues):
+            thread = threading.Thread(
+                target=self._work, args=(updates,), name=f"webhook-worker-{index}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Webhook ingress started with {len(self._threads)} workers")
+
+    def submit(self, payload):
+        """Queue a raw update; returns False if the queue is full"""
+        shard = self._queues[hash(_sender_id(payload)) % len(self._queues)]
+        try:
+            shard.put_nowait(payload)
+        except queue.Full:
+            with self._counter_lock:
+                self.rejected += 1
+            return False
+
+        with self._counter_lock:
+            self.accepted += 1
+        return True
+
+    def depth(self):
+        """Number of updates waiting in all queues"""
+        return sum(updates.qsize() for updates in self._queues)
+
+    def _work(self, updates):
+        while True:
+            payload = updates.get()
+            if payload is None:
+                return
+            try:
+                update = Update.de_json(payload, self.bot)
+                self.dispatcher.process_update(update)
+                with self._counter_lock:
+                    self.processed += 1
+            except Exception:
+                with self._counter_lock:
+                    self.failed += 1
+                logger.exception("Failed to process webhook update")
+
+    def stop(self):
+        """Finish queued updates and stop the workers"""
+        for updates in self._queues:
+            updates.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
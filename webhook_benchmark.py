@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput of the webhook mode.
+
+Runs the real webhook stack (main.start_webhook() with the dispatcher from
+create_updater(), its conversation handlers, persistence and the outbound
+queue) against a local fake Telegram Bot API server that answers getMe,
+setWebhook, sendMessage, editMessageText and answerCallbackQuery. Simulated
+users post complete booking conversations as update JSON to the webhook
+route over HTTP, each user's updates in order; a 429 is retried after a
+short pause, like Telegram does. Prints updates/s from the first post until
+every update has been handled and every reply has reached the fake server.
+The senders and the fake server run in the same process as the bot, so on a
+machine with few cores they take part of its CPU time.
+
+    python webhook_benchmark.py --users 200 --senders 16 --workers 4 --api-latency 0.02
+"""
+import argparse
+import importlib
+import itertools
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOKEN = "123456:webhook-benchmark"
+SECRET = "webhook-benchmark"
+BOT_USER = {'id': 123456, 'is_bot': True, 'first_name': 'Benchmark', 'username': 'benchmark_bot'}
+
+# Users of the simulated conversations
+USER_BASE = 10_000
+
+
+class FakeTelegram(ThreadingHTTPServer):
+    """Bot API server that answers the methods the bot uses, after `latency` seconds"""
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.0):
+        super().__init__(('127.0.0.1', 0), FakeTelegramHandler)
+        self.latency = latency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._message_ids = itertools.count(1)
+
+    def answer(self, method, params):
+        with self._lock:
+            self.calls[method] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        if method == 'getMe':
+            return BOT_USER
+        if method in ('sendMessage', 'editMessageText'):
+            message_id = params.get('message_id') or next(self._message_ids)
+            return {
+                'message_id': message_id, 'date': int(time.time()), 'from': BOT_USER,
+                'chat': {'id': params.get('chat_id'), 'type': 'private'}, 'text': params.get('text', '')
+            }
+        return True
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out as separate writes; Nagle would delay every answer
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        method = self.path.rsplit('/', 1)[-1]
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        params = json.loads(body) if body else {}
+
+        payload = json.dumps({'ok': True, 'result': self.server.answer(method, params)}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Conversation:
+    """Raw updates of one user booking one slot, in the order Telegram would send them"""
+
+    _update_ids = itertools.count(1)
+
+    def __init__(self, user_id, date, time_slot):
+        self.user = {'id': user_id, 'is_bot': False, 'first_name': 'Load'}
+        self.chat = {'id': user_id, 'type': 'private'}
+        # The bot's reply the user presses buttons under
+        self.message = {'message_id': 1, 'date': int(time.time()), 'chat': self.chat, 'from': BOT_USER, 'text': '…'}
+        self.updates = [
+            self._text('/start', command=True),
+            self._text('📅 Забронировать'),
+            self._press(f'date_{date}'),
+            self._press(f'time_{time_slot}'),
+            self._text('Load Test'),
+            self._text('+380501234567'),
+            self._press('confirm_booking'),
+        ]
+
+    def _text(self, text, command=False):
+        update_id = next(self._update_ids)
+        message = {'message_id': update_id, 'date': int(time.time()), 'chat': self.chat, 'from': self.user, 'text': text}
+        if command:
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+        return {'update_id': update_id, 'message': message}
+
+    def _press(self, data):
+        update_id = next(self._update_ids)
+        return {
+            'update_id': update_id,
+            'callback_query': {
+                'id': str(update_id), 'from': self.user, 'chat_instance': str(self.user['id']),
+                'message': self.message, 'data': data
+            }
+        }
+
+
+def configure(args, workdir, api_url):
+    """Point the bot at the fake server and keep its files in workdir (before config is imported)"""
+    os.environ.update({
+        'TELEGRAM_BOT_TOKEN': TOKEN,
+        'TELEGRAM_API_URL': api_url,
+        'WEBHOOK_URL': 'http://127.0.0.1',
+        'WEBHOOK_SECRET': SECRET,
+        'BOT_WORKERS': str(args.workers),
+        'OUTBOUND_WORKERS': str(args.outbound_workers),
+        'WEBHOOK_QUEUE_SIZE': str(args.queue_size),
+        'BOT_INFO_CACHE_PATH': os.path.join(workdir, 'bot_info.json'),
+        'BOOKING_CONVERSATIONS_DB': os.path.join(workdir, 'conversations.db'),
+        'BOOKING_REMINDER_HOURS': '0',
+        'BOOKING_SLOT_CAPACITY': str(args.capacity),
+    })
+    if not args.rate_limits:
+        # Only the stack itself is measured, not Telegram's flood limits
+        os.environ.update({
+            'OUTBOUND_GLOBAL_RATE': '1e9', 'OUTBOUND_CHAT_RATE': '1e9', 'OUTBOUND_CHAT_BURST': '1000000000'
+        })
+
+
+def post(url, payload):
+    """POST one update like Telegram does; returns False when the bot answered 429"""
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode(),
+        headers={'Content-Type': 'application/json', 'X-Telegram-Bot-Api-Secret-Token': SECRET}
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            response.read()
+    except urllib.error.HTTPError as e:
+        if e.code == 429:
+            return False
+        raise
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=200, help="users each running one booking conversation")
+    parser.add_argument("--senders", type=int, default=16, help="threads posting updates")
+    parser.add_argument("--workers", type=int, default=4, help="webhook worker threads (BOT_WORKERS)")
+    parser.add_argument("--outbound-workers", type=int, default=4, help="threads sending replies (OUTBOUND_WORKERS)")
+    parser.add_argument("--queue-size", type=int, default=1000, help="updates buffered before answering 429")
+    parser.add_argument("--capacity", type=int, default=1000, help="bookings a slot can take")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="seconds the fake server takes per call")
+    parser.add_argument("--rate-limits", action="store_true", help="keep the outbound queue's Telegram rate limits")
+    args = parser.parse_args()
+
+    telegram = FakeTelegram(latency=args.api_latency)
+    threading.Thread(target=telegram.serve_forever, daemon=True).start()
+    workdir = tempfile.mkdtemp(prefix="webhook-bench-")
+    configure(args, workdir, f"http://127.0.0.1:{telegram.server_port}/bot")
+
+    # Imported only now: the bot reads its configuration at import time
+    from werkzeug.serving import make_server
+    config = importlib.import_module('config')
+    web_app = importlib.import_module('main')
+    from storage import store
+
+    # Per-update info logs would dominate the measurements
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    server = make_server('127.0.0.1', 0, web_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}{config.WEBHOOK_PATH}"
+
+    slots = [(date, time_slot) for date in config.get_date_range() for time_slot in config.get_time_slots(date)]
+    conversations = [Conversation(USER_BASE + i, *slots[i % len(slots)]) for i in range(args.users)]
+    steps = len(conversations[0].updates)
+    updates = steps * len(conversations)
+    retries = [0] * args.senders
+
+    def sender(index):
+        # Users are split between senders, so each user's updates are posted in order
+        mine = conversations[index::args.senders]
+        for step in range(steps):
+            for conversation in mine:
+                while not post(url, conversation.updates[step]):
+                    retries[index] += 1
+                    time.sleep(0.05)
+
+    try:
+        updater = web_app.start_webhook()
+        ingress = web_app.webhook_ingress
+        bookings_before = store.booking_count()
+        calls_before = sum(telegram.calls.values())
+
+        senders = [threading.Thread(target=sender, args=(i,)) for i in range(args.senders)]
+        started = time.perf_counter()
+        for thread in senders:
+            thread.start()
+        for thread in senders:
+            thread.join()
+        posted = time.perf_counter() - started
+        # Finishes the queued updates and sends every queued reply
+        web_app.stop_webhook(updater)
+        elapsed = time.perf_counter() - started
+    finally:
+        server.shutdown()
+        telegram.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"updates: {updates} from {args.users} users, {ingress.processed} handled, {ingress.failed} failed, "
+          f"{sum(retries)} answered 429")
+    print(f"posted in {posted:.2f} s, handled and replied in {elapsed:.2f} s: {updates / elapsed:.1f} updates/s")
+    print(f"bookings confirmed: {store.booking_count() - bookings_before}")
+    print(f"Bot API calls: {sum(telegram.calls.values()) - calls_before} {dict(telegram.calls)}")
+
+
+if __name__ == "__main__":
+    main()